@@ -0,0 +1,110 @@
+"""Memory and speed of compact rosters against sqlite3.Row member lists.
+
+Run from the repository root:
+
+    python benchmarks/bench_rosters.py [members]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_rosters.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dizzymate  # noqa: E402
+
+CHAT_ID = -100123
+
+
+def get_active_chat_members(chat_id):
+    """The old pick path's member load: one sqlite3.Row per active member."""
+    with dizzymate.get_db_connection(chat_id) as conn:
+        return conn.execute("""
+            SELECT u.user_id, u.username, u.first_name, u.last_name
+            FROM users u
+            JOIN chat_members cm ON cm.user_id = u.user_id
+            WHERE cm.chat_id = ?
+              AND cm.last_active >= datetime('now', '-30 days')
+              AND cm.status IN ('member','administrator','creator')
+              AND u.is_bot = 0
+        """, (chat_id,)).fetchall()
+
+
+def select_random_users_seeded(users, count=1, seed=None, exclude=None):
+    """The old pick path's seeded sample over the loaded rows."""
+    if exclude is None:
+        exclude = []
+    available_users = [user for user in users if user['user_id'] not in exclude]
+    if len(available_users) < count:
+        return available_users
+    if seed:
+        random.seed(seed)
+    selected = random.sample(available_users, count)
+    random.seed()
+    return selected
+
+
+def populate(members):
+    with dizzymate.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)",
+            ((user_id, f"user{user_id}", f"First{user_id}", f"Last{user_id}") for user_id in range(members)),
+        )
+        conn.executemany(
+            "INSERT INTO chat_members (chat_id, user_id) VALUES (?, ?)",
+            ((CHAT_ID, user_id) for user_id in range(members)),
+        )
+        conn.commit()
+
+
+def measure(label, load):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} load {elapsed * 1000:8.1f} ms  retained {retained / 2**20:7.2f} MiB  peak {peak / 2**20:7.2f} MiB")
+    return result
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dizzymate.init_database()
+    populate(members)
+    print(f"{members} active members\n")
+
+    rows = measure("get_active_chat_members", lambda: get_active_chat_members(CHAT_ID))
+    roster = measure("ChatRoster", lambda: dizzymate.ChatRoster(CHAT_ID, dizzymate.iter_active_roster(CHAT_ID)))
+    print(f"\nroster.nbytes estimate: {roster.nbytes / 2**20:.2f} MiB for {len(roster)} members")
+
+    started = time.perf_counter()
+    for day in range(1000):
+        select_random_users_seeded(rows, 2, f"{CHAT_ID}_couple_{day}")
+    list_pick = (time.perf_counter() - started) / 1000
+
+    started = time.perf_counter()
+    for day in range(1000):
+        dizzymate.pick_roster_users(roster, 2, f"{CHAT_ID}_couple_{day}")
+    roster_pick = (time.perf_counter() - started) / 1000
+
+    started = time.perf_counter()
+    roster.alias_table()
+    alias_build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for day in range(1000):
+        dizzymate.pick_roster_users(roster, 2, f"{CHAT_ID}_couple_{day}", weighting="activity")
+    weighted_pick = (time.perf_counter() - started) / 1000
+
+    print(f"pick 2 from Row list:          {list_pick * 1e6:8.1f} us")
+    print(f"pick 2 from roster + profiles: {roster_pick * 1e6:8.1f} us")
+    print(f"build alias table:             {alias_build * 1e3:8.1f} ms")
+    print(f"weighted pick 2 + profiles:    {weighted_pick * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Statements, time and WAL page writes of the profile writes against the old SELECT-then-write paths.
+
+Run from the repository root:
+
+    python benchmarks/bench_upserts.py [writes]
+
+The scratch database is switched to WAL with autocheckpoints off, so the
+frames left in the log after each run are the pages that run wrote.
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_upserts.db")
+os.environ["BOT_TOKENS"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dizzymate  # noqa: E402
+
+CHAT_ID = -100123
+USERS = 1000
+
+
+def legacy_add_or_update_user(user_id, username=None, first_name=None, last_name=None, is_bot=False, language_code=None):
+    with dizzymate.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT aura_points, message_count FROM users WHERE user_id = ?", (user_id,))
+        if cursor.fetchone():
+            cursor.execute("""
+                UPDATE users SET username = ?, first_name = ?, last_name = ?, is_bot = ?, language_code = ?,
+                    message_count = message_count + 1, last_seen = CURRENT_TIMESTAMP
+                WHERE user_id = ?
+            """, (username, first_name, last_name, is_bot, language_code, user_id))
+        else:
+            cursor.execute("""
+                INSERT INTO users (user_id, username, first_name, last_name, is_bot, language_code,
+                    aura_points, message_count, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, 0, 1, CURRENT_TIMESTAMP)
+            """, (user_id, username, first_name, last_name, is_bot, language_code))
+        conn.commit()
+
+
+def legacy_add_chat_member(chat_id, user_id, status='member'):
+    with dizzymate.get_db_connection(chat_id) as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO chat_members (chat_id, user_id, status, last_active)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (chat_id, user_id, status))
+        conn.commit()
+
+
+def legacy_update_member_activity(chat_id, user_id):
+    with dizzymate.get_db_connection(chat_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE chat_members SET last_active = CURRENT_TIMESTAMP WHERE chat_id = ? AND user_id = ?
+        """, (chat_id, user_id))
+        if cursor.rowcount == 0:
+            legacy_add_chat_member(chat_id, user_id)
+        conn.commit()
+
+
+def reset(conn, members):
+    conn.execute("DELETE FROM users")
+    conn.execute("DELETE FROM chat_members")
+    conn.executemany(
+        "INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?)",
+        ((user_id, f"user{user_id}", f"First{user_id}") for user_id in range(USERS)),
+    )
+    conn.executemany(
+        "INSERT INTO chat_members (chat_id, user_id, last_active) VALUES (?, ?, '2000-01-01 00:00:00')",
+        ((CHAT_ID, user_id) for user_id in range(members)),
+    )
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def run(conn, label, write, calls):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    started = time.perf_counter()
+    for args in calls:
+        write(*args)
+    elapsed = time.perf_counter() - started
+    conn.set_trace_callback(None)
+    _, frames, _ = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    # COMMIT shows up in the trace too; count only the data statements
+    queries = sum(1 for sql in statements if sql.strip().split()[0].upper() in ("SELECT", "INSERT", "UPDATE"))
+    print(f"  {label:<10} {queries / len(calls):5.2f} statements/call  "
+          f"{elapsed / len(calls) * 1e6:8.1f} us/call  {frames:6d} WAL frames")
+
+
+def compare(conn, title, members, pairs, calls):
+    print(title)
+    for label, write in pairs:
+        reset(conn, members)
+        run(conn, label, write, calls)
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dizzymate.init_database()
+    with dizzymate.get_db_connection() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA wal_autocheckpoint=0")
+
+        profiles = [(user_id % USERS, f"user{user_id % USERS}", f"First{user_id % USERS}") for user_id in range(writes)]
+        compare(conn, f"add_or_update_user, {writes} messages from {USERS} known users", USERS, [
+            ("select+", legacy_add_or_update_user),
+            ("upsert", dizzymate.add_or_update_user),
+        ], profiles)
+
+        # Bursts: the same members active several times within a second
+        active = [(CHAT_ID, user_id % 50) for user_id in range(writes)]
+        compare(conn, f"update_member_activity, {writes} messages from 50 known members", USERS, [
+            ("update+", legacy_update_member_activity),
+            ("current", dizzymate.update_member_activity),
+        ], active)
+
+        newcomers = [(CHAT_ID, user_id) for user_id in range(USERS)]
+        compare(conn, f"update_member_activity, {USERS} first messages", 0, [
+            ("update+", legacy_update_member_activity),
+            ("current", dizzymate.update_member_activity),
+        ], newcomers)
+
+        rejoins = [(CHAT_ID, user_id % USERS, 'member') for user_id in range(writes)]
+        compare(conn, f"add_chat_member, {writes} syncs of {USERS} unchanged members", USERS, [
+            ("replace", legacy_add_chat_member),
+            ("upsert", dizzymate.add_chat_member),
+        ], rejoins)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Replay a captured update stream through the real handlers.
+
+Record production traffic with CAPTURE_PATH=updates.jsonl.gz, then run
+from the repository root:
+
+    python benchmarks/replay_updates.py updates.jsonl.gz [--speed N] [--api-latency MS] [--db PATH]
+
+--speed 1 keeps the recorded pacing, N replays N times faster and 0 as
+fast as the bot can take it. Bot API calls are answered locally after
+--api-latency milliseconds. The database is a scratch file unless --db
+is given; it must not be the production database.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("capture", help="gzipped JSONL file written by UpdateRecorder")
+parser.add_argument("--speed", type=float, default=0, help="pacing multiplier, 0 = max speed")
+parser.add_argument("--api-latency", type=float, default=0, help="simulated Bot API latency in ms")
+parser.add_argument("--max-gap", type=float, default=5, help="longest recorded pause kept, in seconds")
+parser.add_argument("--db", help="database file to replay into (default: a fresh temp file)")
+args = parser.parse_args()
+
+os.environ["DATABASE_PATH"] = args.db or os.path.join(tempfile.mkdtemp(), "replay.db")
+os.environ["BOT_TOKENS"] = ""
+os.environ.setdefault("CAPTURE_PATH", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import dizzymate  # noqa: E402
+
+BOT_ID = 424242
+
+
+class ReplayRequest(BaseRequest):
+    """Answers Bot API calls locally with just enough of a result to parse."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self.result(endpoint, params)}).encode()
+
+    def result(self, endpoint, params):
+        chat_id = int(params.get("chat_id", 0) or 0)
+        if endpoint == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+        if (endpoint.startswith("send") and endpoint != "sendChatAction") or endpoint == "editMessageText":
+            return {
+                "message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "group"}, "text": params.get("text", ""),
+            }
+        if endpoint == "getChatMember":
+            user_id = int(params.get("user_id", 0))
+            return {"status": "member", "user": {"id": user_id, "is_bot": False, "first_name": "Member"}}
+        if endpoint == "getChat":
+            return {"id": chat_id, "type": "group", "title": f"Chat {chat_id}",
+                    "accent_color_id": 0, "max_reaction_count": 0,
+                    "accepted_gift_types": {"unlimited_gifts": False, "limited_gifts": False,
+                                            "unique_gifts": False, "premium_subscription": False}}
+        if endpoint == "getChatAdministrators":
+            return []
+        if endpoint == "getChatMemberCount":
+            return 0
+        return True
+
+
+class TimedProcessor(dizzymate.PriorityUpdateProcessor):
+    """The production processor, also recording when each update finishes."""
+
+    def __init__(self):
+        super().__init__(tenant=dizzymate.TENANTS[0])
+        self.enqueued = {}
+        self.latencies = []
+
+    async def do_process_update(self, update, coroutine):
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            started = self.enqueued.pop(getattr(update, "update_id", None), None)
+            if started is not None:
+                self.latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+def database_state():
+    with dizzymate.get_db_connection() as conn:
+        users, messages, aura = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(message_count), 0), COALESCE(SUM(aura_points), 0) FROM users"
+        ).fetchone()
+    state = {"users": users, "message_count total": messages, "aura total": aura}
+    for table in dizzymate.CHAT_TABLES:
+        state[table] = sum(row[0] for row in dizzymate.query_all_partitions(f"SELECT COUNT(*) FROM {table}"))
+    return state
+
+
+async def replay():
+    dizzymate.init_database()
+    request = ReplayRequest(args.api_latency / 1000)
+    tenant = dizzymate.TENANTS[0]
+    tenant.token = "424242:replay"
+    processor = tenant.processor = TimedProcessor()
+    application = dizzymate.build_application(tenant, request, updater=False)
+    await application.initialize()
+    await application.start()
+
+    fed = 0
+    previous = None
+    started = time.perf_counter()
+    clock = started
+    for received, payload in dizzymate.iter_captured_updates(args.capture):
+        if args.speed > 0 and previous is not None:
+            clock += min(max(received - previous, 0), args.max_gap) / args.speed
+            delay = clock - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif fed % 100 == 0:
+            # Max speed: let handlers run instead of queueing the whole file up front
+            await asyncio.sleep(0)
+        previous = received
+
+        update = Update.de_json(payload, application.bot)
+        processor.enqueued[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+        fed += 1
+
+    while processor.enqueued or application.update_queue.qsize():
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    processor.flush_merged_activity()
+    tenant.stats.flush()
+    await application.stop()
+    await application.shutdown()
+
+    latencies = sorted(processor.latencies)
+    print(f"replayed {fed} updates in {elapsed:.2f} s ({fed / elapsed if elapsed else 0:.0f} updates/s)")
+    for label, share in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)):
+        print(f"  latency {label}: {percentile(latencies, share) * 1000:8.1f} ms")
+    print(f"  shed: {processor.shed_counts}")
+    print(f"  api calls: {dict(request.calls.most_common())}")
+    print(f"database {os.environ['DATABASE_PATH']}:")
+    for name, value in database_state().items():
+        print(f"  {name:<22} {value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(replay())
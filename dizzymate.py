@@ -1,43 +1,163 @@
 import os
+import sys
+import glob
+import cProfile
+import marshal
+import gzip
+import hashlib
+import hmac
+import heapq
+import itertools
+import queue
+import signal
+import atexit
 import logging
+import logging.handlers
+import math
 import random
+import traceback
 import asyncio
 import json
 import sqlite3
+import contextvars
+from array import array
+from collections import OrderedDict, defaultdict
 from datetime import datetime, date, time, timedelta
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from functools import cached_property, wraps
+from tempfile import NamedTemporaryFile
+from time import monotonic, perf_counter, sleep, time as unix_time
 
 import pytz
 from telegram import (
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
     BotCommand
 )
 from telegram.constants import ChatAction, ParseMode
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
     ContextTypes,
+    BaseUpdateProcessor,
 )
 
 # ─── Imports for Dummy HTTP Server ──────────────────────────────────────────
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = 10000   # records buffered for the writer thread before new ones are dropped
+LOG_RATE_LIMIT = 20      # identical messages let through per window
+LOG_RATE_WINDOW = 60     # seconds
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Leave msg % args to the listener thread; the queue never leaves the process
+        return record
+
+class RateLimitFilter(logging.Filter):
+    """Lets each message template through at most LOG_RATE_LIMIT times per window.
+
+    Only INFO and DEBUG records with args are limited, since only their
+    msg is a shared template; a literal message such as a trace line is
+    usually unique. Warnings and errors always pass: one template such as
+    "Broadcast %s stopped: %s" covers distinct failures, and dropping
+    them would hide the ones that matter. The first record of a new window carries the previous window's
+    suppressed count in record.suppressed.
+    """
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not record.args or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = record.created
+        with self._lock:
+            window_start, count, suppressed = self._seen.get(key, (now, 0, 0))
+            if now - window_start >= self.window:
+                record.suppressed = suppressed
+                window_start, count, suppressed = now, 0, 0
+            if count >= self.limit:
+                self._seen[key] = (window_start, count, suppressed + 1)
+                return False
+            if len(self._seen) > 10000:
+                self._seen.clear()
+            self._seen[key] = (window_start, count + 1, suppressed)
+        return True
+
+class SuppressedCountFormatter(logging.Formatter):
+    """Appends the count a RateLimitFilter stored on the record, if any."""
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f" ({suppressed} similar messages suppressed)"
+        return message
+
+def setup_logging():
+    """Route all logging through a bounded queue to a background writer thread.
+
+    Handlers on the event loop only append the record to the queue;
+    formatting and the write to stdout happen on the listener thread, so a
+    slow pipe can never stall the bot. When the queue is full, records are
+    dropped and counted rather than blocking.
+    """
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(SuppressedCountFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler
+
+log_handler = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Bot configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN", "your_bot_token_here")
 
+# Telegram user ids allowed to run owner-only commands, comma separated
+BOT_OWNER_IDS = {int(owner_id) for owner_id in os.getenv("BOT_OWNER_IDS", "").split(",") if owner_id.strip()}
+
 # Channel and group links for /start command
 UPDATES_CHANNEL = os.getenv("UPDATES_CHANNEL", "https://t.me/your_channel")
 SUPPORT_GROUP = os.getenv("SUPPORT_GROUP", "https://t.me/your_support_group")
@@ -99,17 +219,350 @@ COMMAND_MESSAGES = {
     ]
 }
 
-# Bangladesh timezone for ghost command
-BANGLADESH_TZ = 'Asia/Dhaka'
+# How daily picks choose members: 'uniform', or 'activity' to favour members
+# with more messages who were active more recently
+PICK_WEIGHTING = os.getenv("PICK_WEIGHTING", "uniform")
+PICK_RECENCY_HALF_LIFE_DAYS = 7  # a member's pick weight halves for every week of silence
+ALIAS_MAX_DRAWS = 64             # weighted draws per wanted pick before falling back to uniform
+
+# Daily pick commands. Each entry overrides PICK_DEFAULTS; aura deltas come
+# from AURA_POINTS and templates from COMMAND_MESSAGES.
+PICK_DEFAULTS = {
+    'picks': 1,                 # users selected per day
+    'weighting': PICK_WEIGHTING,  # 'uniform' or 'activity'
+    'window': None,             # time-window gate, e.g. 'night'
+    'exclude_invoker': False,   # never pick the person who ran the command
+    'aura_message': None,       # None picks a +/- line from the aura sign
+    'private_message': "💀 This move’s for bosses in groups. Link me up and set fire to that aura. 🔥",
+    'window_closed_message': None,
+    'hourly_limit_message': "⏳ Patience, boss! Wait an hour before hitting /{command} again 🦾",
+    'daily_limit_message': "⏳ You already ran /{command} today. Come back stronger tomorrow 👑",
+    'too_few_message': "💀 Can’t run this solo. Bring more energy to the chat 🦾",
+    'no_pick_message': "😬 No cap, couldn’t find a user. Try again later, fam!",
+}
+
+PICK_COMMANDS = {
+    'gay': {},
+    'simp': {},
+    'toxic': {},
+    'cringe': {},
+    'respect': {},
+    'sus': {},
+    'couple': {
+        'picks': 2,
+        'aura_message': "\n\n🫶 <b>Duo got +{aura} aura. Love stats rising 📈</b>",
+        'private_message': "💀 This command’s for real squads only. Add me to a group and start the aura hustle 🦾",
+        'too_few_message': "💀 Squad too light to form a couple here. Bring the real ones! 🦾",
+        'no_pick_message': "😭 Couple vibes not loading. Give it another shot later! 🌹",
+    },
+    'ghost': {
+        'window': 'night',
+        'aura_message': "\n\n💀 <b>{aura} aura points! The spirits ain’t vibin’ with you...</b>",
+        'private_message': "💀 This ain’t a solo mission. Add me to a group to unlock the aura grind.",
+        'window_closed_message': (
+            "🌙 Ghost vibes only from 6 PM to 6 AM ({timezone})!\n"
+            "⏰ Chill for {hours}h {minutes}m, then come flex with the shadows... 👻"
+        ),
+        'hourly_limit_message': "⏰ Spirits gotta recharge! Hold up an hour before you summon again...",
+        'daily_limit_message': "👻 Ghost’s already been summoned today! They’re coming back tomorrow, so chill for now...",
+        'too_few_message': "😭 Not enough squad energy here for the spirits to roll through! Get the crew up and try again!",
+        'no_pick_message': "😭 Spirits came through but found no one to vibe with. Bounce back later and try again!",
+    },
+}
+
+# Day boundaries and the ghost night window follow each chat's /timezone
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Dhaka")  # chats that never set one
+NIGHT_START = time(18, 0)      # 6 PM local
+NIGHT_END = time(6, 0)         # 6 AM local
+ROLLOVER_CHECK_INTERVAL = 30   # seconds between sweeps for passed midnights and night edges
+TIMEZONE_CACHE_ENTRIES = 20000  # chat timezones kept in memory
 
 # Member data collection settings
 COLLECT_MEMBERS_ON_JOIN = True
 COLLECT_MEMBERS_ON_MESSAGE = True
 MAX_MEMBERS_PER_BATCH = 200  # Telegram API limit
 
+# Compact member rosters used for daily picks
+ACTIVE_MEMBER_DAYS = 30  # members active this recently can be picked
+ROSTER_TTL = 600         # seconds before a cached roster is reloaded
+ROSTER_CACHE_BUDGET_BYTES = int(os.getenv("ROSTER_CACHE_BUDGET_MB", "64")) * 1024 * 1024
+
+# Windowed leaderboards: /aura week, /aura month
+AURA_WINDOWS = {
+    'week': 7,
+    'month': 30,
+}
+AURA_EVENT_RETENTION_DAYS = 7    # raw events kept for auditing
+AURA_BUCKET_RETENTION_DAYS = 62  # daily buckets kept for the longest window
+
+# Inline mode (@bot lookups); enable it for the bot with BotFather's /setinline
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "30"))  # seconds Telegram reuses a user's answer
+INLINE_RESULT_TTL = 300      # seconds a computed result set is served before reloading
+INLINE_CACHE_ENTRIES = 2000  # result sets kept in memory
+INLINE_CACHE_RANKS = 1_000_000  # ranked members held across cached standings, 16 bytes each
+INLINE_MAX_CHATS = 5         # groups listed per user, most recently active first
+
+# Refresh button under /aura leaderboards
+LEADERBOARD_REFRESH_WINDOW = 2      # seconds of taps on one message merged into one edit
+LEADERBOARD_REFRESH_INTERVAL = 10   # minimum seconds between edits of one message
+LEADERBOARD_REFRESH_TRACKED = 5000  # messages whose last rendering is remembered
+
+# Per-chat statistics (/stats)
+STATS_FLUSH_INTERVAL = 60   # seconds between counter flushes
+STATS_WINDOW_DAYS = 7       # days shown by /stats
+STATS_RETENTION_DAYS = 30   # days of aggregates kept
+
+# Update scheduling and load shedding
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))  # chats handled in parallel, 1 = sequential
+UPDATE_BACKLOG_LIMIT = 10000       # updates accepted before the fetcher blocks
+UPDATE_SHED_THRESHOLD = int(os.getenv("UPDATE_SHED_THRESHOLD", "200"))  # start shedding bookkeeping
+UPDATE_DROP_THRESHOLD = int(os.getenv("UPDATE_DROP_THRESHOLD", "2000"))  # drop bookkeeping outright
+UPDATE_SAMPLE_EVERY = 10           # while shedding, still fully process 1 in N bookkeeping updates
+UPDATE_MERGE_LIMIT = 50000         # distinct (chat, user) pairs held for a merged write
+UPDATE_MERGE_FLUSH_INTERVAL = 5    # seconds between merged activity writes
+
+# Backlog catch-up after a restart
+CATCHUP_BACKLOG = os.getenv("CATCHUP_BACKLOG", "1") == "1"  # 0 drops pending updates instead
+CATCHUP_BATCH_SIZE = 100      # updates per getUpdates call, Telegram's maximum
+CATCHUP_COMMAND_MAX_AGE = int(os.getenv("CATCHUP_COMMAND_MAX_AGE", "120"))  # seconds; older commands are not answered
+
+# Multi-chat broadcasts
+BROADCAST_BATCH_SIZE = 200    # target chats read and checkpointed per batch
+BROADCAST_CONCURRENCY = 8     # sends in flight at once
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # messages per second, all chats together
+BROADCAST_MAX_RETRIES = 5
+
+# Bulk aura adjustments
+BULK_AURA_MAX_DELTA = 10000   # largest change a single adjustment may make
+
+# Per-update tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))  # share of updates traced
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))          # slower updates are always traced
+
+# Event-loop lag monitor and /ready endpoint
+LOOP_LAG_INTERVAL = 0.5          # seconds between loop heartbeats
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "1.0"))  # seconds blocked before dumping the stack
+READY_MAX_LOOP_LAG_MS = float(os.getenv("READY_MAX_LOOP_LAG_MS", "2000"))
+READY_MAX_DB_MS = float(os.getenv("READY_MAX_DB_MS", "1000"))
+READY_MAX_BACKLOG = int(os.getenv("READY_MAX_BACKLOG", "2000"))
+
+# On-demand profiling at /profile on the health server; unset token disables it
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_INTERVAL = 0.005       # seconds between stack samples
+PROFILE_MAX_SECONDS = 60
+
+# Update capture, replayed locally with benchmarks/replay_updates.py
+CAPTURE_PATH = os.getenv("CAPTURE_PATH")  # gzipped JSONL appended to; unset disables capture
+CAPTURE_ANONYMIZE = os.getenv("CAPTURE_ANONYMIZE", "1") == "1"  # hash ids, replace names, mask text
+CAPTURE_SALT = os.getenv("CAPTURE_SALT") or os.urandom(16).hex()  # fix it to keep ids stable across restarts
+CAPTURE_FLUSH_INTERVAL = 5     # seconds between appends
+CAPTURE_BUFFER_LIMIT = 50000   # updates held between appends before new ones are dropped
+
 # Database file path
 DATABASE_PATH = os.getenv("DATABASE_PATH", "aura_bot.db")
 
+# Host several bots in one process: comma separated name=token pairs, which
+# replace BOT_TOKEN. Each bot keeps its data in its own files named after
+# DATABASE_PATH, e.g. aura_bot_brand.db.
+BOT_TOKENS = os.getenv("BOT_TOKENS", "")
+
+# Spread per-chat tables over this many SQLite files by chat_id; 0 keeps one file.
+# Profiles stay in DATABASE_PATH. Convert an existing database with:
+#   STORAGE_PARTITIONS=8 python dizzymate.py migrate-partitions
+STORAGE_PARTITIONS = int(os.getenv("STORAGE_PARTITIONS", "0"))
+
+# Online backups and exports
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL_HOURS = int(os.getenv("BACKUP_INTERVAL_HOURS", "6"))  # 0 disables
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "4"))
+BACKUP_MAX_STEPS = 200        # busy retries before a backup gives up
+BACKUP_STEP_PAUSE = 0.05      # seconds slept between busy retries
+EXPORT_BATCH_SIZE = 500       # rows fetched per cursor batch during export
+
+# ---------------------------------------------------
+# TENANTS
+# ---------------------------------------------------
+
+class Tenant:
+    """One hosted bot: its token, its database files and its per-bot runtime state.
+
+    The event loop, HTTP connection pool, SQLite connections and the
+    roster and inline caches are shared by every tenant; cache keys carry
+    the tenant name so chats never mix between bots.
+    """
+
+    def __init__(self, name, token, database_path):
+        self.name = name
+        self.token = token
+        self.database_path = database_path
+
+    @cached_property
+    def processor(self):
+        """Update processor; update ids and offsets are per bot."""
+        return PriorityUpdateProcessor(tenant=self)
+
+    @cached_property
+    def stats(self):
+        """Pending /stats counters for this bot's chats."""
+        return StatsCollector()
+
+    @cached_property
+    def broadcast_limiter(self):
+        """Flood limits apply per bot token."""
+        return RateLimiter(BROADCAST_RATE)
+
+def parse_tenants(spec=BOT_TOKENS):
+    """Build the tenant list from BOT_TOKENS, or the single BOT_TOKEN bot."""
+    if not spec.strip():
+        return [Tenant('default', BOT_TOKEN, DATABASE_PATH)]
+
+    base, ext = os.path.splitext(DATABASE_PATH)
+    tenants = []
+    for entry in spec.split(","):
+        name, _, token = entry.strip().partition("=")
+        if not name or not token:
+            raise ValueError(f"BOT_TOKENS entries must look like name=token, got {entry.strip()!r}")
+        tenants.append(Tenant(name, token, f"{base}_{name}{ext}"))
+    return tenants
+
+TENANTS = parse_tenants()
+
+# Set for every update, job and startup step; code running outside any
+# tenant (scripts, the health server) sees the first one
+current_tenant = contextvars.ContextVar('current_tenant')
+
+def active_tenant() -> Tenant:
+    """The tenant the current update or job belongs to."""
+    return current_tenant.get(TENANTS[0])
+
+def tenant_job(callback):
+    """Run a job callback with its application's tenant active."""
+    @wraps(callback)
+    async def run(context):
+        token = current_tenant.set(context.application.bot_data['tenant'])
+        try:
+            await callback(context)
+        finally:
+            current_tenant.reset(token)
+    return run
+
+# ---------------------------------------------------
+# TRACING
+# ---------------------------------------------------
+
+trace_logger = logging.getLogger(f"{__name__}.trace")
+
+class UpdateTrace:
+    """Timing breakdown for one update: handlers, DB steps and Bot API calls."""
+
+    def __init__(self, update_id, chat_id):
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.started = perf_counter()
+        self.queued_ms = 0.0
+        self.handlers = []
+        self.db = defaultdict(lambda: [0.0, 0])
+        self.api = defaultdict(lambda: [0.0, 0])
+
+    def add(self, spans, name, elapsed):
+        span = spans[name]
+        span[0] += elapsed * 1000
+        span[1] += 1
+
+    def to_json(self, total_ms) -> str:
+        return json.dumps({
+            'update_id': self.update_id,
+            'chat_id': self.chat_id,
+            'total_ms': round(total_ms, 2),
+            'queued_ms': round(self.queued_ms, 2),
+            'handlers': self.handlers,
+            'db_ms': round(sum(ms for ms, _ in self.db.values()), 2),
+            'db': {name: {'ms': round(ms, 2), 'calls': calls} for name, (ms, calls) in self.db.items()},
+            'api_ms': round(sum(ms for ms, _ in self.api.values()), 2),
+            'api': {name: {'ms': round(ms, 2), 'calls': calls} for name, (ms, calls) in self.api.items()},
+        })
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+# Nesting of DB steps, per task or worker thread rather than per trace
+db_span_depth = contextvars.ContextVar('db_span_depth', default=0)
+
+def untraced(coro):
+    """Wrap a coroutine spawned as background work so it stays out of the current trace.
+
+    Tasks copy the context they were created in, and the update's trace
+    is finished and logged long before a broadcast or a shared load ends.
+    """
+    async def run():
+        current_trace.set(None)
+        return await coro
+    return run()
+
+def finish_trace(trace):
+    """Emit a finished trace if it is sampled or slow."""
+    total_ms = (perf_counter() - trace.started) * 1000
+    if total_ms >= TRACE_SLOW_MS or random.random() < TRACE_SAMPLE_RATE:
+        trace_logger.info(trace.to_json(total_ms))
+
+@contextmanager
+def db_span(name):
+    """Time a database step against the current update's trace."""
+    trace = current_trace.get()
+    if trace is None or db_span_depth.get():
+        # No trace, or already inside an outer DB step that owns the time
+        yield
+        return
+    token = db_span_depth.set(1)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        db_span_depth.reset(token)
+        trace.add(trace.db, name, perf_counter() - started)
+
+def traced_db(func):
+    """Record a DB helper's run time as a step of the current trace."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+def traced_handler(callback):
+    """Record a handler callback's name and run time in the current trace."""
+    @wraps(callback)
+    async def wrapper(update, context):
+        trace = current_trace.get()
+        if trace is None:
+            return await callback(update, context)
+        started = perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            trace.handlers.append({
+                'name': callback.__name__,
+                'ms': round((perf_counter() - started) * 1000, 2),
+            })
+    return wrapper
+
+def instrument_handlers(application):
+    """Wrap every registered handler callback for tracing."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = traced_handler(handler.callback)
+
+class TracedRequest(HTTPXRequest):
+    """HTTPXRequest that records Bot API call time in the current trace."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return await super().do_request(url, method, *args, **kwargs)
+        started = perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            trace.add(trace.api, url.rsplit('/', 1)[-1], perf_counter() - started)
+
 # ---------------------------------------------------
 # DATABASE LAYER
 # ---------------------------------------------------
@@ -117,160 +570,484 @@ DATABASE_PATH = os.getenv("DATABASE_PATH", "aura_bot.db")
 # Thread-local storage for database connections
 local_data = threading.local()
 
+# Tables keyed by chat_id; these move to partition files when partitioned
+CHAT_TABLES = (
+    'chat_members', 'command_usage', 'daily_selections', 'aura_events',
+    'aura_daily', 'chat_stats', 'chat_stats_active', 'chat_settings',
+)
+
+def partition_path(index) -> str:
+    """File name of one partition, e.g. aura_bot.p3.db."""
+    base, ext = os.path.splitext(active_tenant().database_path)
+    return f"{base}.p{index}{ext}"
+
+def partition_paths() -> list[str]:
+    """Every partition file; empty when not partitioned."""
+    return [partition_path(index) for index in range(STORAGE_PARTITIONS)]
+
+def chat_database_path(chat_id) -> str:
+    """File holding a chat's per-chat tables."""
+    if not STORAGE_PARTITIONS:
+        return active_tenant().database_path
+    return partition_path(chat_id % STORAGE_PARTITIONS)
+
+def chat_database_paths() -> list[str]:
+    """Every file holding per-chat tables, for cross-partition queries."""
+    return partition_paths() or [active_tenant().database_path]
+
+def database_paths() -> list[str]:
+    """Every database file in use."""
+    return [active_tenant().database_path, *partition_paths()]
+
 @contextmanager
-def get_db_connection():
-    """Get a thread-local SQLite3 connection."""
-    if not hasattr(local_data, 'conn'):
-        local_data.conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
-        local_data.conn.row_factory = sqlite3.Row
-    
+def connect_path(path):
+    """Get the thread-local SQLite3 connection for one database file.
+
+    Partition connections have the shared profile database attached as
+    `shared`, so unqualified `users` in joins and writes still resolve.
+    Files are switched to WAL, so readers and backups never block writers.
+    """
+    conns = local_data.__dict__.setdefault('conns', {})
+    conn = conns.get(path)
+    if conn is None:
+        shared_path = active_tenant().database_path
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if path != shared_path:
+            conn.execute("ATTACH DATABASE ? AS shared", (shared_path,))
+        # Covers every attached file; the mode sticks to the file once set
+        conn.execute("PRAGMA journal_mode=WAL")
+        conns[path] = conn
+
     try:
-        yield local_data.conn
+        yield conn
     except Exception as e:
-        local_data.conn.rollback()
+        conn.rollback()
         raise e
 
-def init_database():
-    """Initialize the database with required tables."""
+@contextmanager
+def get_db_connection(chat_id=None):
+    """Get a thread-local SQLite3 connection.
+
+    Files belong to the active tenant. Pass the chat_id for anything
+    touching per-chat tables; with STORAGE_PARTITIONS set that selects
+    the chat's partition file.
+    """
+    path = active_tenant().database_path if chat_id is None else chat_database_path(chat_id)
+    with connect_path(path) as conn:
+        yield conn
+
+def query_all_partitions(query, params=()):
+    """Run a read query against every per-chat database file and yield all rows."""
+    for path in chat_database_paths():
+        with connect_path(path) as conn:
+            yield from conn.execute(query, params)
+
+def create_shared_tables(cursor):
+    """Create tables shared by every chat: user profiles and broadcasts."""
+    # Users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            aura_points INTEGER DEFAULT 0,
+            is_bot INTEGER DEFAULT 0,
+            language_code TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            message_count INTEGER DEFAULT 0
+        );
+    """)
+
+    # Broadcasts with a resume checkpoint
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message TEXT,
+            status TEXT DEFAULT 'running',
+            last_chat_id INTEGER,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+    """)
+
+    # Small key/value store for bot-wide state, e.g. the last processed update id
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+
+def create_chat_tables(cursor):
+    """Create tables keyed by chat_id, which live in the chat's partition when partitioned."""
+    # Chat members table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            user_id INTEGER,
+            status TEXT DEFAULT 'member',
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(chat_id, user_id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        );
+    """)
+
+    # Command usage tracking table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS command_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            chat_id INTEGER,
+            command TEXT,
+            used_date DATE,
+            last_announcement TIMESTAMP,
+            UNIQUE(user_id, chat_id, command, used_date),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        );
+    """)
+
+    # Daily selections table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_selections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            command TEXT,
+            selected_user_id INTEGER,
+            selected_user_id_2 INTEGER,
+            selection_date DATE,
+            selection_data TEXT,
+            UNIQUE(chat_id, command, selection_date)
+        );
+    """)
+
+    # Append-only aura event log
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS aura_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            user_id INTEGER,
+            delta INTEGER,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_aura_events_created
+        ON aura_events (created_at);
+    """)
+
+    # Daily aura buckets rolled up from aura_events
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS aura_daily (
+            chat_id INTEGER,
+            user_id INTEGER,
+            bucket_date DATE,
+            points INTEGER DEFAULT 0,
+            PRIMARY KEY (chat_id, bucket_date, user_id)
+        ) WITHOUT ROWID;
+    """)
+
+    # Per-chat daily aggregates for /stats
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_stats (
+            chat_id INTEGER,
+            stat_date DATE,
+            metric TEXT,
+            key TEXT DEFAULT '',
+            value INTEGER DEFAULT 0,
+            PRIMARY KEY (chat_id, stat_date, metric, key)
+        ) WITHOUT ROWID;
+    """)
+
+    # Distinct active members per chat and day, feeds the active_members counter
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_stats_active (
+            chat_id INTEGER,
+            stat_date DATE,
+            user_id INTEGER,
+            PRIMARY KEY (chat_id, stat_date, user_id)
+        ) WITHOUT ROWID;
+    """)
+
+    # Per-chat preferences, e.g. the timezone that sets day boundaries
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_settings (
+            chat_id INTEGER PRIMARY KEY,
+            timezone TEXT
+        );
+    """)
+
+def unmigrated_chat_tables(cursor) -> list[str]:
+    """Per-chat tables in the shared file that still hold rows."""
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [
+        table for table in CHAT_TABLES
+        if table in existing and cursor.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+    ]
+
+def recorded_partitions(cursor) -> int:
+    """Partition count the data was laid out for.
+
+    Older partitioned files predate the bot_state record; for those the
+    partition files on disk are counted.
+    """
+    cursor.execute("SELECT value FROM bot_state WHERE key = 'storage_partitions'")
+    row = cursor.fetchone()
+    if row:
+        return int(row['value'])
+    base, ext = os.path.splitext(active_tenant().database_path)
+    return sum(
+        1 for path in glob.glob(f"{glob.escape(base)}.p*{ext}")
+        if path[len(base) + 2:len(path) - len(ext)].isdigit()
+    )
+
+def record_partitions(cursor):
+    """Store STORAGE_PARTITIONS as the layout of the data."""
+    cursor.execute("""
+        INSERT INTO bot_state (key, value) VALUES ('storage_partitions', ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value
+    """, (str(STORAGE_PARTITIONS),))
+
+def init_database(migrating=False):
+    """Initialize the database with required tables.
+
+    Refuses to start when STORAGE_PARTITIONS differs from the partition
+    count recorded with the data: chats would be looked up in the wrong
+    files and appear empty. Going from unpartitioned to partitioned is
+    allowed while the shared file holds no chat data yet; otherwise
+    migrate-partitions has to move it first.
+    """
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        create_shared_tables(cursor)
+        recorded = recorded_partitions(cursor)
+        if not migrating and recorded != STORAGE_PARTITIONS:
+            if recorded:
+                raise RuntimeError(
+                    f"{active_tenant().database_path} is split into {recorded} partitions "
+                    f"but STORAGE_PARTITIONS is {STORAGE_PARTITIONS}; set it back to {recorded}"
+                )
+            unmigrated = unmigrated_chat_tables(cursor)
+            if unmigrated:
+                raise RuntimeError(
+                    f"{active_tenant().database_path} still holds {', '.join(unmigrated)}; "
+                    f"run `STORAGE_PARTITIONS={STORAGE_PARTITIONS} python dizzymate.py migrate-partitions` first"
+                )
+        if not STORAGE_PARTITIONS:
+            create_chat_tables(cursor)
+        if not migrating:
+            record_partitions(cursor)
+        conn.commit()
 
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                aura_points INTEGER DEFAULT 0,
-                is_bot INTEGER DEFAULT 0,
-                language_code TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                message_count INTEGER DEFAULT 0
-            );
-        """)
+    for path in partition_paths():
+        with connect_path(path) as conn:
+            create_chat_tables(conn.cursor())
+            conn.commit()
 
-        # Chat members table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chat_members (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER,
-                user_id INTEGER,
-                status TEXT DEFAULT 'member',
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(chat_id, user_id),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            );
-        """)
+    logger.info("Database initialized successfully")
 
-        # Command usage tracking table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS command_usage (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                chat_id INTEGER,
-                command TEXT,
-                used_date DATE,
-                last_announcement TIMESTAMP,
-                UNIQUE(user_id, chat_id, command, used_date),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            );
-        """)
+def migrate_to_partitions(batch_size=EXPORT_BATCH_SIZE):
+    """Move the active tenant's per-chat tables into STORAGE_PARTITIONS files.
 
-        # Daily selections table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS daily_selections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER,
-                command TEXT,
-                selected_user_id INTEGER,
-                selected_user_id_2 INTEGER,
-                selection_date DATE,
-                selection_data TEXT,
-                UNIQUE(chat_id, command, selection_date)
-            );
-        """)
+    Run once, with the bot stopped. Rows are streamed `batch_size` at a time
+    and routed by chat_id; each partition commits once per table, then the
+    old tables are dropped from the shared file and it is vacuumed.
+    """
+    if not STORAGE_PARTITIONS:
+        raise RuntimeError("Set STORAGE_PARTITIONS before migrating")
+    existing = [path for path in partition_paths() if os.path.exists(path)]
+    if existing:
+        raise RuntimeError(f"Partition files already exist: {', '.join(existing)}")
+
+    init_database(migrating=True)
+    moved = 0
+    with get_db_connection() as source:
+        for table in CHAT_TABLES:
+            cursor = source.execute(f"SELECT * FROM {table}")
+            columns = [column[0] for column in cursor.description]
+            chat_index = columns.index('chat_id')
+            insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                by_path = defaultdict(list)
+                for row in rows:
+                    by_path[chat_database_path(row[chat_index])].append(tuple(row))
+                for path, group in by_path.items():
+                    with connect_path(path) as conn:
+                        conn.executemany(insert, group)
+                moved += len(rows)
+            for path in partition_paths():
+                with connect_path(path) as conn:
+                    conn.commit()
+            logger.info("Migrated %s into %d partitions", table, STORAGE_PARTITIONS)
+
+        for table in CHAT_TABLES:
+            source.execute(f"DROP TABLE {table}")
+        record_partitions(source.cursor())
+        source.commit()
+        source.execute("VACUUM")
+    return moved
+
+# Single-statement upserts. message_count and last_seen move on every
+# message, so a user row is always rewritten. Membership upserts pass the
+# existing row id: a VALUES insert that falls through to the update would
+# still draw a new AUTOINCREMENT id and rewrite sqlite_sequence.
+UPSERT_USER_SQL = """
+    INSERT INTO users (
+        user_id, username, first_name, last_name, is_bot, language_code,
+        aura_points, message_count, last_seen
+    )
+    VALUES (?, ?, ?, ?, ?, ?, 0, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        is_bot = excluded.is_bot,
+        language_code = excluded.language_code,
+        message_count = message_count + excluded.message_count,
+        last_seen = excluded.last_seen
+"""
 
-        conn.commit()
-        logger.info("Database initialized successfully")
+# Activity from known members, the common case, is a plain UPDATE; the
+# insert only runs for a member the UPDATE did not find.
+TOUCH_MEMBER_SQL = """
+    UPDATE chat_members SET last_active = CURRENT_TIMESTAMP
+    WHERE chat_id = ? AND user_id = ?
+"""
+
+INSERT_MEMBER_SQL = """
+    INSERT INTO chat_members (chat_id, user_id, last_active)
+    VALUES (?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (chat_id, user_id) DO UPDATE SET last_active = excluded.last_active
+"""
+
+def touch_member(cursor, chat_id, user_id):
+    """Refresh a membership's last_active on an open cursor, adding the member if new."""
+    cursor.execute(TOUCH_MEMBER_SQL, (chat_id, user_id))
+    if cursor.rowcount == 0:
+        cursor.execute(INSERT_MEMBER_SQL, (chat_id, user_id))
 
+@traced_db
 def add_or_update_user(user_id, username=None, first_name=None, last_name=None, is_bot=False, language_code=None):
     """Add or update user information with enhanced data collection."""
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Check if user exists
-        cursor.execute("SELECT aura_points, message_count FROM users WHERE user_id = ?", (user_id,))
-        existing_user = cursor.fetchone()
-        
-        if existing_user:
-            # Update existing user
-            cursor.execute("""
-                UPDATE users SET
-                    username = ?,
-                    first_name = ?,
-                    last_name = ?,
-                    is_bot = ?,
-                    language_code = ?,
-                    message_count = message_count + 1,
-                    last_seen = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-            """, (username, first_name, last_name, is_bot, language_code, user_id))
-        else:
-            # Insert new user
-            cursor.execute("""
-                INSERT INTO users (
-                    user_id, username, first_name, last_name, is_bot, language_code,
-                    aura_points, message_count, last_seen
-                )
-                VALUES (?, ?, ?, ?, ?, ?, 0, 1, CURRENT_TIMESTAMP)
-            """, (user_id, username, first_name, last_name, is_bot, language_code))
-        
+        conn.execute(UPSERT_USER_SQL, (user_id, username, first_name, last_name, is_bot, language_code, 1))
         conn.commit()
 
+@traced_db
 def add_chat_member(chat_id, user_id, status='member'):
-    """Add or update chat member information."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO chat_members (
-                chat_id, user_id, status, last_active
-            )
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    """Add or update chat member information, keeping the original joined_at."""
+    with get_db_connection(chat_id) as conn:
+        conn.execute("""
+            INSERT INTO chat_members (id, chat_id, user_id, status, last_active)
+            VALUES ((SELECT id FROM chat_members WHERE chat_id = ?1 AND user_id = ?2), ?1, ?2, ?3, CURRENT_TIMESTAMP)
+            ON CONFLICT DO UPDATE SET
+                status = excluded.status,
+                last_active = excluded.last_active
+            WHERE status IS NOT excluded.status OR last_active IS NOT excluded.last_active
         """, (chat_id, user_id, status))
         conn.commit()
 
+@traced_db
 def update_member_activity(chat_id, user_id):
-    """Update member's last activity timestamp."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE chat_members
-            SET last_active = CURRENT_TIMESTAMP
-            WHERE chat_id = ? AND user_id = ?
-        """, (chat_id, user_id))
-        
-        if cursor.rowcount == 0:
-            add_chat_member(chat_id, user_id)
-        
+    """Update member's last activity timestamp, adding the member if needed."""
+    with get_db_connection(chat_id) as conn:
+        touch_member(conn.cursor(), chat_id, user_id)
         conn.commit()
 
-def update_aura_points(user_id, points):
-    """Update user's aura points."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
+@traced_db
+def bulk_track_activity(entries):
+    """Apply many (user_info, chat_id, message_count) activity records, one transaction per file."""
+    by_path = defaultdict(list)
+    for entry in entries:
+        by_path[chat_database_path(entry[1])].append(entry)
+
+    # One transaction per database file; a single one unless partitioned
+    for path, group in by_path.items():
+        with connect_path(path) as conn:
+            write_activity(conn.cursor(), group)
+            conn.commit()
+
+def write_activity(cursor, entries):
+    """Upsert profiles and memberships for activity entries on an open cursor."""
+    cursor.executemany(UPSERT_USER_SQL, [
+        (info['user_id'], info['username'], info['first_name'], info['last_name'],
+         info['is_bot'], info['language_code'], count)
+        for info, _, count in entries
+    ])
+    for info, chat_id, _ in entries:
+        touch_member(cursor, chat_id, info['user_id'])
+
+# Callables taking a list of chat ids, run after aura changes are committed
+AURA_CACHE_INVALIDATORS = []
+
+def invalidate_aura_caches(chat_ids):
+    """Tell every aura-dependent cache that these chats' standings changed."""
+    for invalidator in AURA_CACHE_INVALIDATORS:
+        invalidator(chat_ids)
+
+def write_aura_changes(cursor, changes, chat_id=None, reason=None, profile=True):
+    """Apply (user_id, delta) pairs on an open cursor; the caller commits.
+
+    With profile=False only the chat's events and daily buckets move,
+    leaving the all-time points every chat shares untouched.
+    """
+    if profile:
+        cursor.executemany("""
             UPDATE users SET aura_points = aura_points + ? WHERE user_id = ?
-        """, (points, user_id))
+        """, [(points, user_id) for user_id, points in changes])
+
+    if chat_id is not None:
+        # Event and bucket go in the same transaction so buckets never lag
+        cursor.executemany("""
+            INSERT INTO aura_events (chat_id, user_id, delta, reason)
+            VALUES (?, ?, ?, ?)
+        """, [(chat_id, user_id, points, reason) for user_id, points in changes])
+        today = date.today().isoformat()
+        cursor.executemany("""
+            INSERT INTO aura_daily (chat_id, user_id, bucket_date, points)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (chat_id, bucket_date, user_id)
+            DO UPDATE SET points = points + excluded.points
+        """, [(chat_id, user_id, today, points) for user_id, points in changes])
+
+@traced_db
+def apply_aura_adjustments(chat_id, adjustments, reason='bulk', profile=True):
+    """Apply many (user_id, delta) pairs in one transaction.
+
+    Deltas for the same user are summed first, and dependent caches are
+    invalidated once for the whole batch. profile is passed on to
+    write_aura_changes. Returns the applied pairs.
+    """
+    merged = defaultdict(int)
+    for user_id, delta in adjustments:
+        merged[user_id] += delta
+    changes = [(user_id, delta) for user_id, delta in merged.items() if delta]
+    if not changes:
+        return []
+
+    with get_db_connection(chat_id) as conn:
+        write_aura_changes(conn.cursor(), changes, chat_id, reason, profile)
         conn.commit()
+    invalidate_aura_caches([chat_id])
+    return changes
 
+@traced_db
 def can_use_command(user_id, chat_id, command):
     """Check if user can use a command (daily and hourly limits)."""
-    with get_db_connection() as conn:
+    today = chat_today(chat_id)
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
-        today = date.today().isoformat()
         cursor.execute("""
             SELECT last_announcement FROM command_usage
             WHERE user_id = ? AND chat_id = ? AND command = ? AND used_date = ?
@@ -286,11 +1063,12 @@ def can_use_command(user_id, chat_id, command):
             return False, 'daily_limit'
         return True, 'allowed'
 
+@traced_db
 def mark_command_used(user_id, chat_id, command):
-    """Mark command usage for the day."""
-    with get_db_connection() as conn:
+    """Mark command usage for the chat's local day."""
+    today = chat_today(chat_id)
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
-        today = date.today().isoformat()
         now = datetime.now().isoformat()
         cursor.execute("""
             INSERT OR REPLACE INTO command_usage (
@@ -300,9 +1078,10 @@ def mark_command_used(user_id, chat_id, command):
         """, (user_id, chat_id, command, today, now))
         conn.commit()
 
+@traced_db
 def get_leaderboard(chat_id, limit=10):
     """Get aura leaderboard for a chat."""
-    with get_db_connection() as conn:
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT u.user_id, u.username, u.first_name, u.last_name, u.aura_points
@@ -314,9 +1093,43 @@ def get_leaderboard(chat_id, limit=10):
         """, (chat_id, limit))
         return cursor.fetchall()
 
+@traced_db
+def get_windowed_leaderboard(chat_id, days, limit=10):
+    """Get aura leaderboard for the last `days` days from daily buckets."""
+    with get_db_connection(chat_id) as conn:
+        cursor = conn.cursor()
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        cursor.execute("""
+            SELECT u.user_id, u.username, u.first_name, u.last_name, b.aura_points
+            FROM (
+                SELECT user_id, SUM(points) AS aura_points
+                FROM aura_daily
+                WHERE chat_id = ? AND bucket_date >= ?
+                GROUP BY user_id
+            ) b
+            JOIN users u ON u.user_id = b.user_id
+            WHERE u.is_bot = 0
+            ORDER BY b.aura_points DESC
+            LIMIT ?
+        """, (chat_id, since, limit))
+        return cursor.fetchall()
+
+@traced_db
+def get_user_chats(user_id, limit):
+    """Get the ids of the groups a user was most recently active in."""
+    rows = query_all_partitions("""
+        SELECT chat_id, last_active FROM chat_members
+        WHERE user_id = ? AND chat_id < 0 AND status != 'left'
+        ORDER BY last_active DESC
+        LIMIT ?
+    """, (user_id, limit))
+    rows = sorted(rows, key=lambda row: row['last_active'], reverse=True)
+    return [row['chat_id'] for row in rows[:limit]]
+
+@traced_db
 def get_chat_users(chat_id):
     """Get all users in a chat."""
-    with get_db_connection() as conn:
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT u.user_id, u.username, u.first_name, u.last_name
@@ -328,46 +1141,79 @@ def get_chat_users(chat_id):
         """, (chat_id,))
         return cursor.fetchall()
 
-def get_active_chat_members(chat_id):
-    """Get active chat members (last 30 days)."""
-    with get_db_connection() as conn:
+@traced_db
+def filter_chat_member_ids(chat_id, user_ids):
+    """Keep only the user ids that are current human members of a chat."""
+    if not user_ids:
+        return []
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
-        thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
-        cursor.execute("""
-            SELECT u.user_id, u.username, u.first_name, u.last_name
-            FROM users u
-            JOIN chat_members cm ON cm.user_id = u.user_id
-            WHERE cm.chat_id = ? 
-              AND cm.last_active >= ?
+        placeholders = ",".join("?" * len(user_ids))
+        cursor.execute(f"""
+            SELECT cm.user_id
+            FROM chat_members cm
+            JOIN users u ON u.user_id = cm.user_id
+            WHERE cm.chat_id = ?
+              AND cm.user_id IN ({placeholders})
               AND cm.status IN ('member','administrator','creator')
               AND u.is_bot = 0
-        """, (chat_id, thirty_days_ago))
-        return cursor.fetchall()
+        """, (chat_id, *user_ids))
+        return [row['user_id'] for row in cursor.fetchall()]
 
-def save_daily_selection(chat_id, command, user_id, user_id_2=None, selection_data=None):
-    """Save daily selection for a command."""
-    with get_db_connection() as conn:
+def iter_active_roster(chat_id, days=ACTIVE_MEMBER_DAYS):
+    """Yield (user_id, last_active epoch seconds, message_count) for recently active members of a chat."""
+    with get_db_connection(chat_id) as conn:
+        cursor = conn.cursor()
+        # Ordered by user_id so a seeded pick sees the same roster on every load
+        cursor.execute("""
+            SELECT cm.user_id, CAST(strftime('%s', cm.last_active) AS INTEGER), u.message_count
+            FROM chat_members cm
+            JOIN users u ON u.user_id = cm.user_id
+            WHERE cm.chat_id = ?
+              AND cm.last_active >= datetime('now', ?)
+              AND cm.status IN ('member','administrator','creator')
+              AND u.is_bot = 0
+            ORDER BY cm.user_id
+        """, (chat_id, f"-{days} days"))
+        # Plain tuples straight off the cursor, no sqlite3.Row per member
+        cursor.row_factory = None
+        yield from cursor
+
+@traced_db
+def save_daily_pick(chat_id, command, user_ids, aura_change):
+    """Save today's pick and award its aura in one transaction."""
+    zone = chat_timezones.get(chat_id)
+    today = day_rollover.today(zone)
+    user_id_2 = user_ids[1] if len(user_ids) > 1 else None
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
-        today = date.today().isoformat()
-        data_json = json.dumps(selection_data) if selection_data else None
         cursor.execute("""
             INSERT OR REPLACE INTO daily_selections (
                 chat_id, command, selected_user_id, selected_user_id_2, selection_date, selection_data
             )
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (chat_id, command, user_id, user_id_2, today, data_json))
+            VALUES (?, ?, ?, ?, ?, NULL)
+        """, (chat_id, command, user_ids[0], user_id_2, today))
+        write_aura_changes(cursor, [(user_id, aura_change) for user_id in user_ids], chat_id, command)
         conn.commit()
+    todays_picks.put(zone, chat_id, command, {'user_id': user_ids[0], 'user_id_2': user_id_2, 'data': None})
+    invalidate_aura_caches([chat_id])
 
+@traced_db
 def get_daily_selection(chat_id, command):
-    """Get daily selection for a command."""
-    with get_db_connection() as conn:
+    """Get today's selection for a command, read once per chat and local day."""
+    zone = chat_timezones.get(chat_id)
+    today = day_rollover.today(zone)
+    return todays_picks.get(zone, chat_id, command, lambda: load_daily_selection(chat_id, command, today))
+
+def load_daily_selection(chat_id, command, day):
+    """Read a command's selection for one day from the database."""
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
-        today = date.today().isoformat()
         cursor.execute("""
             SELECT selected_user_id, selected_user_id_2, selection_data
             FROM daily_selections
             WHERE chat_id = ? AND command = ? AND selection_date = ?
-        """, (chat_id, command, today))
+        """, (chat_id, command, day))
         row = cursor.fetchone()
         
         if row:
@@ -378,9 +1224,176 @@ def get_daily_selection(chat_id, command):
             }
         return None
 
+@traced_db
+def get_chat_timezone(chat_id):
+    """Get a chat's configured timezone name, or None if it never set one."""
+    with get_db_connection(chat_id) as conn:
+        row = conn.execute("SELECT timezone FROM chat_settings WHERE chat_id = ?", (chat_id,)).fetchone()
+        return row['timezone'] if row else None
+
+@traced_db
+def set_chat_timezone(chat_id, timezone):
+    """Store a chat's timezone name."""
+    with get_db_connection(chat_id) as conn:
+        conn.execute("""
+            INSERT INTO chat_settings (chat_id, timezone) VALUES (?, ?)
+            ON CONFLICT (chat_id) DO UPDATE SET timezone = excluded.timezone
+        """, (chat_id, timezone))
+        conn.commit()
+
+@traced_db
+def flush_chat_stats(counters, active_members):
+    """Write a batch of stat counters and newly active members, one transaction per file.
+
+    Both are keyed by chat_id: counters map to {(stat_date, metric, key): value}
+    and active_members to sets of (stat_date, user_id).
+    """
+    by_path = defaultdict(lambda: ([], []))
+    for chat_id, chat_counters in counters.items():
+        by_path[chat_database_path(chat_id)][0].extend(
+            (chat_id, *counter_key, value) for counter_key, value in chat_counters.items()
+        )
+    for chat_id, members in active_members.items():
+        by_path[chat_database_path(chat_id)][1].extend((chat_id, *member) for member in members)
+
+    for path, (counter_rows, members) in by_path.items():
+        with connect_path(path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO chat_stats (chat_id, stat_date, metric, key, value)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (chat_id, stat_date, metric, key)
+                DO UPDATE SET value = value + excluded.value
+            """, counter_rows)
+
+            for chat_id, stat_date, user_id in members:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO chat_stats_active (chat_id, stat_date, user_id)
+                    VALUES (?, ?, ?)
+                """, (chat_id, stat_date, user_id))
+                if cursor.rowcount:
+                    cursor.execute("""
+                        INSERT INTO chat_stats (chat_id, stat_date, metric, key, value)
+                        VALUES (?, ?, 'active_members', '', 1)
+                        ON CONFLICT (chat_id, stat_date, metric, key)
+                        DO UPDATE SET value = value + 1
+                    """, (chat_id, stat_date))
+            conn.commit()
+
+@traced_db
+def get_chat_stats(chat_id, days):
+    """Get aggregated stat rows for a chat over the last `days` days."""
+    with get_db_connection(chat_id) as conn:
+        cursor = conn.cursor()
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        cursor.execute("""
+            SELECT stat_date, metric, key, value
+            FROM chat_stats
+            WHERE chat_id = ? AND stat_date >= ?
+        """, (chat_id, since))
+        return cursor.fetchall()
+
+@traced_db
+def get_users_by_ids(user_ids):
+    """Get profiles for several users with a single query, keyed by user_id."""
+    if not user_ids:
+        return {}
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        placeholders = ",".join("?" * len(user_ids))
+        cursor.execute(f"""
+            SELECT user_id, username, first_name, last_name
+            FROM users WHERE user_id IN ({placeholders})
+        """, tuple(user_ids))
+        return {row['user_id']: row for row in cursor.fetchall()}
+
+@traced_db
+def create_broadcast(message, created_by):
+    """Record a new broadcast and return its id."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO broadcasts (message, created_by)
+            VALUES (?, ?)
+        """, (message, created_by))
+        conn.commit()
+        return cursor.lastrowid
+
+@traced_db
+def get_running_broadcasts():
+    """Get broadcasts that have not finished, oldest first."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, message, last_chat_id, sent, failed, created_by
+            FROM broadcasts
+            WHERE status = 'running'
+            ORDER BY id
+        """)
+        return cursor.fetchall()
+
+@traced_db
+def get_broadcast_targets(after_chat_id, limit):
+    """Get the next page of group chat ids, in chat_id order, after a checkpoint."""
+    # Each partition returns its own first page; the merged page is the smallest of those
+    chat_ids = {row['chat_id'] for row in query_all_partitions("""
+        SELECT chat_id FROM (
+            SELECT chat_id FROM chat_members WHERE chat_id < 0
+            UNION
+            SELECT chat_id FROM daily_selections WHERE chat_id < 0
+        )
+        WHERE chat_id > ?
+        ORDER BY chat_id
+        LIMIT ?
+    """, (after_chat_id, limit))}
+    return sorted(chat_ids)[:limit]
+
+@traced_db
+def checkpoint_broadcast(broadcast_id, last_chat_id, sent, failed):
+    """Save how far a broadcast got."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE broadcasts SET last_chat_id = ?, sent = ?, failed = ?
+            WHERE id = ?
+        """, (last_chat_id, sent, failed, broadcast_id))
+        conn.commit()
+
+@traced_db
+def finish_broadcast(broadcast_id, status='done'):
+    """Mark a broadcast as finished."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE broadcasts SET status = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (status, broadcast_id))
+        conn.commit()
+
+@traced_db
+def get_bot_state(key, default=None):
+    """Read a value from the bot_state table."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM bot_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        return row['value'] if row else default
+
+@traced_db
+def set_bot_state(key, value):
+    """Write a value to the bot_state table."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO bot_state (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """, (key, str(value)))
+        conn.commit()
+
+@traced_db
 def get_chat_member_count(chat_id):
     """Get count of chat members."""
-    with get_db_connection() as conn:
+    with get_db_connection(chat_id) as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT COUNT(*) as count
@@ -390,16 +1403,247 @@ def get_chat_member_count(chat_id):
         """, (chat_id,))
         return cursor.fetchone()['count']
 
+def backup_database(source_path, dest_path, max_steps=BACKUP_MAX_STEPS, pause=BACKUP_STEP_PAUSE):
+    """Copy a live database file to dest_path with the sqlite3 online backup API.
+
+    Blocking; run it in a worker thread. The whole file is copied in one
+    step: SQLite restarts an online backup whenever another connection
+    writes to the source, so a backup spread over several steps may never
+    finish on a busy bot. With the source in WAL mode that step reads a
+    snapshot and writers carry on meanwhile. Steps that find the source
+    locked are retried after `pause`, at most `max_steps` times. The copy
+    lands under a temporary name and is renamed into place once complete.
+    """
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        if status == sqlite3.SQLITE_DONE:
+            return
+        steps += 1
+        if steps >= max_steps:
+            raise RuntimeError(f"backup of {source_path} still busy after {steps} steps")
+        sleep(pause)
+
+    partial_path = f"{dest_path}.part"
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(partial_path)
+    try:
+        source.backup(target, pages=-1, progress=progress)
+        # The copy inherits WAL from the source; keep backups single files
+        target.execute("PRAGMA journal_mode=DELETE")
+    except Exception:
+        target.close()
+        os.remove(partial_path)
+        raise
+    finally:
+        target.close()
+        source.close()
+    os.replace(partial_path, dest_path)
+
+def backup_name(source_path, stamp) -> str:
+    """Backup file name for one database file, e.g. aura_bot-20250101-000000.p3.db."""
+    stem = os.path.basename(active_tenant().database_path).split('.', 1)[0]
+    return f"{stem}-{stamp}{os.path.basename(source_path)[len(stem):]}"
+
+def prune_backups(backup_dir, keep):
+    """Remove all but the newest `keep` backups in backup_dir, partitions included."""
+    stem = os.path.basename(active_tenant().database_path).split('.', 1)[0]
+    by_stamp = defaultdict(list)
+    for backup in glob.glob(os.path.join(backup_dir, f"{stem}-*")):
+        if backup.endswith(".part"):
+            continue
+        by_stamp[os.path.basename(backup)[len(stem) + 1:].split('.', 1)[0]].append(backup)
+
+    stamps = sorted(by_stamp)
+    for stamp in stamps[:-keep] if keep > 0 else stamps:
+        for old_backup in by_stamp[stamp]:
+            os.remove(old_backup)
+
+def export_chat_data(chat_id, dest_path, batch_size=EXPORT_BATCH_SIZE):
+    """Stream one chat's users, members, selections, aura and settings to gzipped JSONL.
+
+    Rows are pulled from the cursor `batch_size` at a time and written
+    straight out, so memory use stays flat however large the chat is.
+    Blocking; run it in a worker thread. Returns the number of rows written.
+    """
+    queries = {
+        'users': ("""
+            SELECT u.*
+            FROM users u
+            JOIN chat_members cm ON cm.user_id = u.user_id
+            WHERE cm.chat_id = ?
+        """, (chat_id,)),
+        'chat_members': ("SELECT * FROM chat_members WHERE chat_id = ?", (chat_id,)),
+        'daily_selections': ("SELECT * FROM daily_selections WHERE chat_id = ?", (chat_id,)),
+        'aura_daily': ("SELECT * FROM aura_daily WHERE chat_id = ?", (chat_id,)),
+        'aura_events': ("SELECT * FROM aura_events WHERE chat_id = ?", (chat_id,)),
+        'chat_settings': ("SELECT * FROM chat_settings WHERE chat_id = ?", (chat_id,)),
+    }
+
+    written = 0
+    with get_db_connection(chat_id) as conn, gzip.open(dest_path, 'wt', encoding='utf-8') as out:
+        for table, (query, params) in queries.items():
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    out.write(json.dumps({'table': table, 'row': dict(row)}, ensure_ascii=False))
+                    out.write("\n")
+                written += len(rows)
+    return written
+
+@traced_db
 def cleanup_old_data():
     """Clean up old data from database."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
-        cursor.execute("""
-            DELETE FROM command_usage
-            WHERE last_announcement < ?
-        """, (seven_days_ago,))
-        conn.commit()
+    seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
+    stats_cutoff = (date.today() - timedelta(days=STATS_RETENTION_DAYS)).isoformat()
+    for path in chat_database_paths():
+        with connect_path(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM command_usage
+                WHERE last_announcement < ?
+            """, (seven_days_ago,))
+            compact_aura_events(cursor)
+            cursor.execute("DELETE FROM chat_stats WHERE stat_date < ?", (stats_cutoff,))
+            cursor.execute("DELETE FROM chat_stats_active WHERE stat_date < ?", (stats_cutoff,))
+            conn.commit()
+
+def compact_aura_events(cursor):
+    """Drop aura events and buckets that fell out of every leaderboard window.
+
+    Every event is already folded into its daily bucket when it is written,
+    so old events can go without losing any windowed totals.
+    """
+    cursor.execute("""
+        DELETE FROM aura_events
+        WHERE created_at < datetime('now', ?)
+    """, (f"-{AURA_EVENT_RETENTION_DAYS} days",))
+    buckets_cutoff = (date.today() - timedelta(days=AURA_BUCKET_RETENTION_DAYS)).isoformat()
+    cursor.execute("""
+        DELETE FROM aura_daily
+        WHERE bucket_date < ?
+    """, (buckets_cutoff,))
+
+# ---------------------------------------------------
+# CHAT STATISTICS
+# ---------------------------------------------------
+
+class StatsCollector:
+    """In-memory per-chat counters, flushed to chat_stats in batches.
+
+    Handlers only bump dictionary entries; the periodic flush job turns
+    everything accumulated since the last flush into one transaction.
+    Pending entries are grouped by chat, so /stats reads only its own.
+    """
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._active = defaultdict(set)
+        self._seen_day = None
+        self._seen = set()
+
+    def incr(self, chat_id, metric, key='', amount=1):
+        """Bump a counter for today."""
+        self._counters[chat_id][(date.today().isoformat(), metric, str(key))] += amount
+
+    def mark_active(self, chat_id, user_id):
+        """Record that a user was active in a chat today."""
+        today = date.today().isoformat()
+        if self._seen_day != today:
+            # Day rolled over, yesterday's members no longer need deduplicating
+            self._seen_day = today
+            self._seen.clear()
+        member = (chat_id, today, user_id)
+        if member not in self._seen:
+            self._seen.add(member)
+            self._active[chat_id].add((today, user_id))
+
+    def flush(self):
+        """Write pending counters to the database."""
+        if not self._counters and not self._active:
+            return
+        counters, active = self._counters, self._active
+        self._counters, self._active = defaultdict(lambda: defaultdict(int)), defaultdict(set)
+        try:
+            flush_chat_stats(counters, active)
+        except Exception:
+            # Put the batch back so the next flush retries it
+            for chat_id, chat_counters in counters.items():
+                for counter_key, value in chat_counters.items():
+                    self._counters[chat_id][counter_key] += value
+            for chat_id, members in active.items():
+                self._active[chat_id] |= members
+            raise
+
+    def pending_rows(self, chat_id):
+        """Yield not-yet-flushed counters for a chat, shaped like get_chat_stats rows."""
+        for (stat_date, metric, key), value in self._counters.get(chat_id, {}).items():
+            yield {'stat_date': stat_date, 'metric': metric, 'key': key, 'value': value}
+        for stat_date, _ in self._active.get(chat_id, ()):
+            yield {'stat_date': stat_date, 'metric': 'active_members', 'key': '', 'value': 1}
+
+def summarize_chat_stats(rows):
+    """Fold stat rows into per-day series and overall totals."""
+    summary = {
+        'messages': defaultdict(int),
+        'commands': defaultdict(int),
+        'active_members': defaultdict(int),
+        'command_totals': defaultdict(int),
+        'pick_totals': defaultdict(int),
+    }
+    for row in rows:
+        metric, value = row['metric'], row['value']
+        if metric == 'picks':
+            summary['pick_totals'][int(row['key'])] += value
+            continue
+        if metric == 'commands':
+            summary['command_totals'][row['key']] += value
+        if metric in summary:
+            summary[metric][row['stat_date']] += value
+    return summary
+
+def top_entries(totals, limit=5):
+    """Return the `limit` largest (key, count) pairs of a totals dict."""
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def format_chat_stats(summary, profiles, chat_title=None, days=STATS_WINDOW_DAYS):
+    """Format the /stats message from a stats summary."""
+    title = "📊 <b>Chat Stats</b>"
+    if chat_title:
+        title += f" - <b>{sanitize_html(chat_title)}</b>"
+    text = f"{title}\n<i>Last {days} days</i>\n\n"
+
+    text += "📅 <b>Day · Msgs · Cmds · Active</b>\n"
+    for offset in range(days - 1, -1, -1):
+        day = (date.today() - timedelta(days=offset)).isoformat()
+        text += (
+            f"{day[5:]} · {summary['messages'][day]} · "
+            f"{summary['commands'][day]} · {summary['active_members'][day]}\n"
+        )
+
+    if summary['command_totals']:
+        text += "\n⚡ <b>Top commands</b>\n"
+        for command, count in top_entries(summary['command_totals']):
+            text += f"/{sanitize_html(command)}: {count}\n"
+
+    if summary['pick_totals']:
+        text += "\n🎯 <b>Most picked</b>\n"
+        for user_id, count in top_entries(summary['pick_totals']):
+            profile = profiles.get(user_id)
+            mention = get_user_mention_html_from_data(
+                user_id,
+                profile['username'] if profile else None,
+                profile['first_name'] if profile else None,
+                profile['last_name'] if profile else None
+            )
+            text += f"{mention}: {count}\n"
+
+    return text
 
 # ---------------------------------------------------
 # MENTION HELPERS
@@ -431,30 +1675,356 @@ def format_user_display_name(username: str | None, first_name: str | None, last_
     return _build_name(first_name, last_name)
 
 # ---------------------------------------------------
-# TIME UTILS FOR GHOST COMMAND
+# DAY ROLLOVER
 # ---------------------------------------------------
 
-def is_night_time_in_bangladesh() -> bool:
-    """Check if it's night time in Bangladesh (6 PM to 6 AM)."""
-    bd_tz = pytz.timezone(BANGLADESH_TZ)
-    bd_time = datetime.now(bd_tz).time()
-    night_start = time(18, 0)  # 6 PM
-    night_end = time(6, 0)     # 6 AM
-    return bd_time >= night_start or bd_time <= night_end
-
-def get_time_until_night() -> tuple[int, int]:
-    """Get time remaining until night time in Bangladesh."""
-    bd_tz = pytz.timezone(BANGLADESH_TZ)
-    bd_now = datetime.now(bd_tz)
-    bd_time = bd_now.time()
-    if bd_time < time(18, 0):
-        next_night = bd_now.replace(hour=18, minute=0, second=0, microsecond=0)
-    else:
-        next_night = bd_now.replace(hour=18, minute=0, second=0, microsecond=0) + timedelta(days=1)
-    time_diff = next_night - bd_now
-    hours = int(time_diff.total_seconds() // 3600)
-    minutes = int((time_diff.total_seconds() % 3600) // 60)
-    return hours, minutes
+TIMEZONE_NAMES = {name.lower(): name for name in pytz.all_timezones}
+
+def resolve_timezone(name):
+    """Canonical zone name for input like 'europe/berlin', or None if unknown."""
+    return TIMEZONE_NAMES.get(name.strip().lower())
+
+class ChatTimezones:
+    """LRU cache of each chat's timezone name.
+
+    One cache serves every tenant; entries are keyed by (tenant, chat_id).
+    Chats without a setting, or with a zone pytz no longer knows, use
+    DEFAULT_TIMEZONE.
+    """
+
+    def __init__(self, max_entries=TIMEZONE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._zones = OrderedDict()
+
+    def get(self, chat_id) -> str:
+        key = (active_tenant().name, chat_id)
+        zone = self._zones.get(key)
+        if zone is not None:
+            self._zones.move_to_end(key)
+            return zone
+
+        stored = get_chat_timezone(chat_id)
+        zone = self._zones[key] = (stored and resolve_timezone(stored)) or DEFAULT_TIMEZONE
+        while len(self._zones) > self.max_entries:
+            self._zones.popitem(last=False)
+        return zone
+
+    def set(self, chat_id, zone):
+        set_chat_timezone(chat_id, zone)
+        self._zones[(active_tenant().name, chat_id)] = zone
+
+chat_timezones = ChatTimezones()
+
+class ZoneClock:
+    """A zone's local date and night state, valid until next_change."""
+
+    __slots__ = ('today', 'night', 'next_midnight', 'next_night_start', 'next_change')
+
+    def __init__(self, zone, now):
+        tz = pytz.timezone(zone)
+        local = datetime.fromtimestamp(now, tz)
+        day, clock = local.date(), local.time()
+
+        def next_at(at):
+            # Localized per day, so DST shifts move the transition with the wall clock
+            when = tz.localize(datetime.combine(day, at))
+            if clock >= at:
+                when = tz.localize(datetime.combine(day + timedelta(days=1), at))
+            return when.timestamp()
+
+        self.today = day.isoformat()
+        if NIGHT_START > NIGHT_END:
+            self.night = clock >= NIGHT_START or clock < NIGHT_END
+        else:
+            self.night = NIGHT_START <= clock < NIGHT_END
+        self.next_midnight = next_at(time(0))
+        self.next_night_start = next_at(NIGHT_START)
+        self.next_change = min(self.next_midnight, self.next_night_start, next_at(NIGHT_END))
+
+# Callables taking (zone, event), event being 'midnight', 'night_start' or 'night_end'
+DAY_ROLLOVER_LISTENERS = []
+
+class DayRollover:
+    """Cached day boundaries and night windows for every timezone in use.
+
+    Each zone's clock is computed once and reused until its next midnight
+    or night edge, so commands only compare a timestamp. When a transition
+    passes, the clock is rebuilt and DAY_ROLLOVER_LISTENERS hear about it
+    once for the whole zone, whichever of advance() or a lookup sees it
+    first.
+    """
+
+    def __init__(self):
+        self._clocks = {}
+        self.rollovers = 0
+
+    def clock(self, zone) -> ZoneClock:
+        now = unix_time()
+        clock = self._clocks.get(zone)
+        if clock is None:
+            clock = self._clocks[zone] = ZoneClock(zone, now)
+        elif now >= clock.next_change:
+            previous, clock = clock, ZoneClock(zone, now)
+            self._clocks[zone] = clock
+            self._announce(zone, previous, clock)
+        return clock
+
+    def today(self, zone) -> str:
+        """The zone's local date as an ISO string."""
+        return self.clock(zone).today
+
+    def is_night(self, zone) -> bool:
+        """Whether the zone is inside the NIGHT_START-NIGHT_END window."""
+        return self.clock(zone).night
+
+    def until_night(self, zone) -> tuple[int, int]:
+        """Hours and minutes until the zone's night window opens."""
+        remaining = max(0, int(self.clock(zone).next_night_start - unix_time()))
+        return remaining // 3600, remaining % 3600 // 60
+
+    def advance(self):
+        """Roll over every zone whose next transition has passed."""
+        now = unix_time()
+        for zone in [zone for zone, clock in self._clocks.items() if now >= clock.next_change]:
+            self.clock(zone)
+
+    def _announce(self, zone, previous, clock):
+        self.rollovers += 1
+        events = []
+        if previous.today != clock.today:
+            events.append('midnight')
+        if previous.night != clock.night:
+            events.append('night_start' if clock.night else 'night_end')
+        for event in events:
+            logger.info("Day rollover in %s: %s", zone, event)
+            for listener in DAY_ROLLOVER_LISTENERS:
+                try:
+                    listener(zone, event)
+                except Exception as e:
+                    logger.error("Day rollover listener failed for %s: %s", zone, e)
+
+    def snapshot(self) -> dict:
+        """Zones tracked and rollovers seen."""
+        return {'zones': len(self._clocks), 'rollovers': self.rollovers}
+
+day_rollover = DayRollover()
+
+def chat_today(chat_id) -> str:
+    """The chat's local date as an ISO string."""
+    return day_rollover.today(chat_timezones.get(chat_id))
+
+class TodaysPicks:
+    """Today's daily selections, bucketed by the chat's timezone.
+
+    A miss is cached too, so repeated commands in a chat read the
+    selection once per day. A zone's whole bucket is dropped by its
+    midnight rollover.
+    """
+
+    def __init__(self):
+        self._zones = defaultdict(dict)
+
+    def get(self, zone, chat_id, command, load):
+        bucket = self._zones[zone]
+        key = (active_tenant().name, chat_id, command)
+        if key not in bucket:
+            bucket[key] = load()
+        return bucket[key]
+
+    def put(self, zone, chat_id, command, selection):
+        self._zones[zone][(active_tenant().name, chat_id, command)] = selection
+
+    def forget_chat(self, chat_id):
+        """Drop a chat's entries, e.g. after its timezone changed."""
+        tenant = active_tenant().name
+        for bucket in self._zones.values():
+            for key in [key for key in bucket if key[:2] == (tenant, chat_id)]:
+                del bucket[key]
+
+    def expire(self, zone, event):
+        if event == 'midnight':
+            self._zones.pop(zone, None)
+
+todays_picks = TodaysPicks()
+DAY_ROLLOVER_LISTENERS.append(todays_picks.expire)
+
+# ---------------------------------------------------
+# MEMBER ROSTERS
+# ---------------------------------------------------
+
+class ChatRoster:
+    """Active members of one chat held as parallel int arrays.
+
+    A 100k member chat costs about 4 MB here, against tens of MB for
+    the equivalent list of sqlite3.Row objects. Names are only looked up
+    for the members that actually get picked.
+
+    Activity-weighted picks use a Walker alias table built from the
+    roster on first use, so each weighted draw is O(1) however large the
+    chat. The table is reused until the roster is reloaded or the day
+    changes, since recency is measured in whole days.
+    """
+
+    __slots__ = ('chat_id', 'user_ids', 'last_active', 'message_counts', 'loaded_at', '_alias')
+
+    def __init__(self, chat_id, members):
+        self.chat_id = chat_id
+        self.user_ids = array('q')
+        self.last_active = array('q')
+        self.message_counts = array('q')
+        for user_id, last_active, message_count in members:
+            self.user_ids.append(user_id)
+            self.last_active.append(last_active or 0)
+            self.message_counts.append(message_count or 0)
+        self.loaded_at = monotonic()
+        self._alias = None
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the roster."""
+        arrays = (self.user_ids, self.last_active, self.message_counts)
+        held = sum(values.buffer_info()[1] * values.itemsize for values in arrays)
+        # Counted up front so the cache budget holds once an alias table is built
+        return held + 16 * len(self.user_ids) + 200
+
+    def activity_weight(self, index, today_end) -> float:
+        """Pick weight of one member: grows with messages, halves per PICK_RECENCY_HALF_LIFE_DAYS idle."""
+        idle_days = (today_end - self.last_active[index]) // 86400
+        return (1 + math.log1p(self.message_counts[index])) * 0.5 ** (idle_days / PICK_RECENCY_HALF_LIFE_DAYS)
+
+    def alias_table(self):
+        """Return the (probability, alias) arrays for today's activity weights."""
+        today_end = (int(datetime.now(pytz.utc).timestamp()) // 86400 + 1) * 86400
+        if self._alias is None or self._alias[0] != today_end:
+            weights = [self.activity_weight(index, today_end) for index in range(len(self.user_ids))]
+            self._alias = (today_end, *build_alias_table(weights))
+        return self._alias[1:]
+
+    def sample(self, count, seed=None, exclude=None, weighting='uniform'):
+        """Pick up to `count` distinct user ids, reproducibly for a given seed."""
+        exclude = set(exclude or ())
+        rng = random.Random(seed)
+        size = len(self.user_ids)
+        if size - len(exclude) <= count:
+            # Small or mostly excluded roster, sample the eligible members directly
+            eligible = [user_id for user_id in self.user_ids if user_id not in exclude]
+            if len(eligible) <= count:
+                return eligible
+            return rng.sample(eligible, count)
+
+        if weighting == 'activity':
+            return self._weighted_sample(rng, count, exclude)
+
+        picked = []
+        for index in rng.sample(range(size), min(size, count + len(exclude))):
+            user_id = self.user_ids[index]
+            if user_id not in exclude:
+                picked.append(user_id)
+                if len(picked) == count:
+                    break
+        return picked
+
+    def _weighted_sample(self, rng, count, exclude):
+        prob, alias = self.alias_table()
+        size = len(self.user_ids)
+        picked = []
+        seen = set(exclude)
+        for _ in range(ALIAS_MAX_DRAWS * count):
+            index = int(rng.random() * size)
+            if rng.random() >= prob[index]:
+                index = alias[index]
+            user_id = self.user_ids[index]
+            if user_id not in seen:
+                picked.append(user_id)
+                seen.add(user_id)
+                if len(picked) == count:
+                    return picked
+
+        # Nearly all the weight sits on excluded or already picked members
+        remaining = [user_id for user_id in self.user_ids if user_id not in seen]
+        return picked + rng.sample(remaining, count - len(picked))
+
+def build_alias_table(weights):
+    """Build Walker alias arrays (Vose's method) for O(1) weighted draws."""
+    size = len(weights)
+    prob = array('d', bytes(8 * size))
+    alias = array('q', bytes(8 * size))
+    total = math.fsum(weights)
+    if not size or total <= 0:
+        return array('d', [1.0]) * size, alias
+
+    scaled = [weight * size / total for weight in weights]
+    small = [index for index, value in enumerate(scaled) if value < 1]
+    large = [index for index, value in enumerate(scaled) if value >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] += scaled[less] - 1
+        (small if scaled[more] < 1 else large).append(more)
+    # Leftovers are 1 up to rounding error
+    for index in small + large:
+        prob[index] = 1.0
+    return prob, alias
+
+class RosterCache:
+    """LRU cache of chat rosters bounded by a total memory budget.
+
+    One cache serves every tenant; entries are keyed by (tenant, chat_id).
+    """
+
+    def __init__(self, budget_bytes=ROSTER_CACHE_BUDGET_BYTES, ttl=ROSTER_TTL):
+        self.budget_bytes = budget_bytes
+        self.ttl = ttl
+        self.used_bytes = 0
+        self.evictions = 0
+        self._rosters = OrderedDict()
+
+    def get(self, chat_id) -> ChatRoster:
+        """Return the chat's roster, loading it if missing or stale."""
+        key = (active_tenant().name, chat_id)
+        roster = self._rosters.get(key)
+        if roster is not None and monotonic() - roster.loaded_at < self.ttl:
+            self._rosters.move_to_end(key)
+            return roster
+
+        self.invalidate(chat_id)
+        with db_span('load_roster'):
+            roster = ChatRoster(chat_id, iter_active_roster(chat_id))
+        self._rosters[key] = roster
+        self.used_bytes += roster.nbytes
+        self._evict(keep=key)
+        return roster
+
+    def invalidate(self, chat_id):
+        """Forget a chat's roster so the next pick reloads it."""
+        roster = self._rosters.pop((active_tenant().name, chat_id), None)
+        if roster is not None:
+            self.used_bytes -= roster.nbytes
+
+    def _evict(self, keep):
+        # Least recently used first; never the roster that was just loaded
+        while self.used_bytes > self.budget_bytes and len(self._rosters) > 1:
+            key, roster = next(iter(self._rosters.items()))
+            if key == keep:
+                break
+            del self._rosters[key]
+            self.used_bytes -= roster.nbytes
+            self.evictions += 1
+
+    def snapshot(self) -> dict:
+        """Current cache size and eviction metrics."""
+        return {
+            'rosters': len(self._rosters),
+            'used_bytes': self.used_bytes,
+            'budget_bytes': self.budget_bytes,
+            'evictions': self.evictions,
+        }
+
+member_rosters = RosterCache()
 
 # ---------------------------------------------------
 # RANDOM USER SELECTION
@@ -469,29 +2039,26 @@ def select_random_users(users, count=1, exclude=None):
         return available_users
     return random.sample(available_users, count)
 
-def select_random_users_seeded(users, count=1, seed=None, exclude=None):
-    """Select random users with a seed for consistent daily selection."""
-    if exclude is None:
-        exclude = []
-    available_users = [user for user in users if user['user_id'] not in exclude]
-    if len(available_users) < count:
-        return available_users
-    if seed:
-        random.seed(seed)
-    selected = random.sample(available_users, count)
-    random.seed()
-    return selected
+def pick_roster_users(roster, count=1, seed=None, exclude=None, weighting='uniform'):
+    """Pick users from a roster and resolve only their profiles."""
+    picked_ids = roster.sample(count, seed, exclude, weighting)
+    profiles = get_users_by_ids(picked_ids)
+    return [profiles[user_id] for user_id in picked_ids if user_id in profiles]
 
 # ---------------------------------------------------
 # LEADERBOARD FORMATTING
 # ---------------------------------------------------
 
-def format_aura_leaderboard(leaderboard_data, chat_title=None):
+def format_aura_leaderboard(leaderboard_data, chat_title=None, period=None):
     """Format aura leaderboard message with Gen Z Sigma energy."""
+    heading = "Aura Farmers"
+    if period:
+        heading += f" of the {period.capitalize()}"
+
     if not leaderboard_data:
-        return "📈 <b>Aura Farmers</b> 📈\n\n💀 Zero aura. Zero ambition. Fix that, king 👑"
+        return f"📈 <b>{heading}</b> 📈\n\n💀 Zero aura. Zero ambition. Fix that, king 👑"
 
-    title = "📈 <b>Aura Farmers</b>"
+    title = f"📈 <b>{heading}</b>"
     if chat_title:
         title += f" - <b>{chat_title}</b>"
     title += " 📈\n\n"
@@ -515,29 +2082,892 @@ def format_aura_leaderboard(leaderboard_data, chat_title=None):
     return leaderboard_text
 
 # ---------------------------------------------------
-# OTHER HELPERS
+# INLINE MODE
 # ---------------------------------------------------
 
-def extract_user_info(user):
-    """Extract user information from Telegram user object."""
-    return {
-        'user_id': user.id,
-        'username': user.username,
-        'first_name': user.first_name,
-        'last_name': getattr(user, 'last_name', None),
-        'is_bot': user.is_bot,
-        'language_code': user.language_code
-    }
+class SharedResultCache:
+    """TTL and LRU bounded cache whose misses are loaded once per key.
 
-def sanitize_html(text: str) -> str:
-    """Sanitize HTML text."""
-    import html
-    return html.escape(text)
+    Concurrent callers asking for a key that is being loaded await the
+    same load instead of starting their own. Keys start with the tenant
+    name, so one cache serves every hosted bot. invalidate() drops entries,
+    and a load that was running when it was called is not stored. Besides
+    the entry count, the summed weigh(value) of all entries is capped.
+    """
 
-# ---------------------------------------------------
-# HANDLER FUNCTIONS
+    def __init__(self, ttl=INLINE_RESULT_TTL, max_entries=INLINE_CACHE_ENTRIES,
+                 weigh=lambda value: 1, max_weight=INLINE_CACHE_RANKS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.weigh = weigh
+        self.max_weight = max_weight
+        self.weight = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._generation = 0
+        self.counts = {'hits': 0, 'misses': 0, 'shared': 0}
+
+    async def get(self, key, load):
+        """Return the cached value for key, awaiting load() on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None and monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(key)
+            self.counts['hits'] += 1
+            return entry[1]
+
+        task = self._loading.get(key)
+        if task is None:
+            self.counts['misses'] += 1
+            task = self._loading[key] = asyncio.ensure_future(untraced(self._load(key, load)))
+        else:
+            self.counts['shared'] += 1
+        # A caller giving up must not cancel the load others are waiting on
+        return await asyncio.shield(task)
+
+    async def _load(self, key, load):
+        generation = self._generation
+        try:
+            value = await load()
+        finally:
+            self._loading.pop(key, None)
+        if generation == self._generation:
+            self._drop(key)
+            weight = self.weigh(value)
+            self._entries[key] = (monotonic(), value, weight)
+            self.weight += weight
+            while self._entries and (len(self._entries) > self.max_entries or self.weight > self.max_weight):
+                self._drop(next(iter(self._entries)))
+        return value
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    def invalidate(self, matches):
+        """Drop every entry whose key satisfies matches(key)."""
+        self._generation += 1
+        for key in [key for key in self._entries if matches(key)]:
+            self._drop(key)
+
+    def snapshot(self) -> dict:
+        """Current size and hit metrics."""
+        return {'entries': len(self._entries), 'weight': self.weight, 'loading': len(self._loading), **self.counts}
+
+def result_weight(value) -> int:
+    """Members ranked in a standings entry; other results count as one."""
+    return len(value['user_ids']) if isinstance(value, dict) else 1
+
+inline_results = SharedResultCache(weigh=result_weight)
+
+def invalidate_inline_standings(chat_ids):
+    """Drop the active tenant's cached standings for chats whose aura changed.
+
+    All-time points are global, so a change also moves the user on other
+    chats' all-time boards; those catch up within INLINE_RESULT_TTL.
+    """
+    tenant, chat_ids = active_tenant().name, set(chat_ids)
+    inline_results.invalidate(lambda key: key[:2] == (tenant, 'standings') and key[2] in chat_ids)
+
+AURA_CACHE_INVALIDATORS.append(invalidate_inline_standings)
+
+def compute_standings(chat_id, period, chat_title):
+    """Rank every member of a chat and pre-render its leaderboard message.
+
+    The ranking is kept as two int arrays in rank order, about 16 bytes per
+    member, and looked up with standing_rank().
+    """
+    if period:
+        rows = get_windowed_leaderboard(chat_id, AURA_WINDOWS[period], -1)
+    else:
+        rows = get_leaderboard(chat_id, -1)
+    return {
+        'title': chat_title,
+        'text': format_aura_leaderboard(rows[:10], chat_title and sanitize_html(chat_title), period),
+        'user_ids': array('q', (row['user_id'] for row in rows)),
+        'points': array('q', (row['aura_points'] or 0 for row in rows)),
+        'size': len(rows),
+    }
+
+def standing_rank(entry, user_id):
+    """A user's (rank, points) in computed standings, or (None, 0) if unranked."""
+    try:
+        index = entry['user_ids'].index(user_id)
+    except ValueError:
+        return None, 0
+    return index + 1, entry['points'][index]
+
+async def load_standings(bot, chat_id, period):
+    """Fetch a chat's title and compute its standings off the event loop."""
+    try:
+        chat = await bot.get_chat(chat_id)
+        chat_title = chat.title
+    except (BadRequest, Forbidden):
+        chat_title = None
+    return await asyncio.to_thread(compute_standings, chat_id, period, chat_title)
+
+def build_inline_results(user, period, standings):
+    """Build the "my aura" article plus one leaderboard article per chat."""
+    label = f"this {period}" if period else "all time"
+    if not standings:
+        return [InlineQueryResultArticle(
+            id=f"me:{period or 'all'}",
+            title="📈 My aura",
+            description="No groups yet - farm some aura first",
+            input_message_content=InputTextMessageContent(
+                "💀 Zero aura. Zero ambition. Add me to a group and start farming 👑"
+            ),
+        )]
+
+    lines = [f"📈 <b>{get_user_mention_html(user)}'s aura, {label}</b> 📈\n"]
+    best = None
+    for chat_id, entry in standings:
+        rank, points = standing_rank(entry, user.id)
+        where = sanitize_html(entry['title']) if entry['title'] else "a group"
+        if rank is None:
+            lines.append(f"💤 Unranked in <b>{where}</b>")
+        else:
+            lines.append(f"🏅 #{rank} of {entry['size']} in <b>{where}</b>: <b>{points}</b> Aura")
+            if best is None or rank < best:
+                best = rank
+
+    results = [InlineQueryResultArticle(
+        id=f"me:{period or 'all'}",
+        title="📈 My aura",
+        description=f"Best rank #{best} ({label})" if best else f"Unranked ({label})",
+        input_message_content=InputTextMessageContent("\n".join(lines), parse_mode=ParseMode.HTML),
+    )]
+    for chat_id, entry in standings:
+        rank, points = standing_rank(entry, user.id)
+        results.append(InlineQueryResultArticle(
+            id=f"lb:{chat_id}:{period or 'all'}",
+            title=f"🏆 {entry['title'] or 'Group'} leaderboard",
+            description=f"You: #{rank}, {points} Aura" if rank else "You're not on this board yet",
+            input_message_content=InputTextMessageContent(entry['text'], parse_mode=ParseMode.HTML),
+        ))
+    return results
+
+def leaderboard_keyboard(period):
+    """Refresh button attached to every /aura leaderboard."""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Refresh", callback_data=f"aura_refresh:{period or 'all'}")
+    ]])
+
+class LeaderboardRefresher:
+    """Merges refresh taps on one leaderboard message into one recompute and edit.
+
+    The first tap schedules a refresh LEADERBOARD_REFRESH_WINDOW later,
+    held back further if the message was edited less than
+    LEADERBOARD_REFRESH_INTERVAL ago; taps arriving meanwhile join it.
+    The edit is skipped when the new rendering matches what the message
+    already shows.
+    """
+
+    def __init__(self, window=LEADERBOARD_REFRESH_WINDOW, interval=LEADERBOARD_REFRESH_INTERVAL,
+                 tracked=LEADERBOARD_REFRESH_TRACKED):
+        self.window = window
+        self.interval = interval
+        self.tracked = tracked
+        self._pending = {}
+        self._shown = OrderedDict()  # key -> (digest of the shown text, earliest next edit)
+        self.counts = {'taps': 0, 'merged': 0, 'edits': 0, 'unchanged': 0, 'throttled': 0}
+
+    def request(self, bot, chat_id, message_id, period, chat_title) -> bool:
+        """Queue a refresh of a leaderboard message; False if one is already queued."""
+        key = (active_tenant().name, chat_id, message_id)
+        self.counts['taps'] += 1
+        if key in self._pending:
+            self.counts['merged'] += 1
+            return False
+        self._pending[key] = asyncio.ensure_future(
+            untraced(self._refresh(key, bot, chat_id, message_id, period, chat_title))
+        )
+        return True
+
+    async def _refresh(self, key, bot, chat_id, message_id, period, chat_title):
+        try:
+            await asyncio.sleep(self.window)
+            shown = self._shown.get(key)
+            if shown and shown[1] > monotonic():
+                await asyncio.sleep(shown[1] - monotonic())
+            # Taps from here on queue another refresh, as the data may already be read
+            self._pending.pop(key, None)
+
+            entry = await inline_results.get(
+                (key[0], 'standings', chat_id, period),
+                lambda: asyncio.to_thread(compute_standings, chat_id, period, chat_title),
+            )
+            digest = hashlib.sha1(entry['text'].encode()).digest()
+            if shown and shown[0] == digest:
+                self.counts['unchanged'] += 1
+                return
+            try:
+                await bot.edit_message_text(
+                    entry['text'], chat_id=chat_id, message_id=message_id,
+                    parse_mode=ParseMode.HTML, reply_markup=leaderboard_keyboard(period),
+                )
+                self.counts['edits'] += 1
+            except RetryAfter as e:
+                # Leave the digest unknown so the next tap after the pause edits again
+                self.counts['throttled'] += 1
+                self._remember(key, None, e.retry_after)
+                return
+            except BadRequest as e:
+                if 'not modified' not in str(e).lower():
+                    raise
+                self.counts['unchanged'] += 1
+            self._remember(key, digest, self.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Leaderboard refresh failed for chat %s: %s", chat_id, e)
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+
+    def _remember(self, key, digest, hold):
+        self._shown[key] = (digest, monotonic() + hold)
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.tracked:
+            self._shown.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        """Queued refreshes and tap metrics."""
+        return {'pending': len(self._pending), **self.counts}
+
+leaderboard_refresher = LeaderboardRefresher()
+
+# ---------------------------------------------------
+# OTHER HELPERS
+# ---------------------------------------------------
+
+def extract_user_info(user):
+    """Extract user information from Telegram user object."""
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': getattr(user, 'last_name', None),
+        'is_bot': user.is_bot,
+        'language_code': user.language_code
+    }
+
+def sanitize_html(text: str) -> str:
+    """Sanitize HTML text."""
+    import html
+    return html.escape(text)
+
+# ---------------------------------------------------
+# UPDATE CAPTURE
+# ---------------------------------------------------
+
+CAPTURE_ID_KEYS = {'id', 'user_id', 'chat_id'}
+CAPTURE_NAME_KEYS = {'first_name', 'last_name', 'username', 'title'}
+CAPTURE_TEXT_KEYS = {'text', 'caption', 'query'}
+
+def pseudonymous_id(value, salt) -> int:
+    """Map a Telegram id to a stable keyed hash of similar size, keeping its sign."""
+    digest = hmac.new(salt.encode(), str(abs(value)).encode(), hashlib.sha256).digest()
+    pseudo = int.from_bytes(digest[:6], 'big') % 10**12 + 1
+    return -pseudo if value < 0 else pseudo
+
+def anonymize_payload(value, salt):
+    """Return a copy of an update payload with ids hashed, names replaced and text masked.
+
+    Commands keep their leading /command token and every text keeps its
+    length, so message entities and handler routing still line up.
+    """
+    if isinstance(value, list):
+        return [anonymize_payload(item, salt) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    result = {}
+    for key, item in value.items():
+        if key in CAPTURE_ID_KEYS and isinstance(item, int) and not isinstance(item, bool):
+            result[key] = pseudonymous_id(item, salt)
+        elif key in CAPTURE_NAME_KEYS and isinstance(item, str):
+            result[key] = f"{key[0]}{hashlib.sha256((salt + item).encode()).hexdigest()[:8]}"
+        elif key in CAPTURE_TEXT_KEYS and isinstance(item, str):
+            keep = len(item.split(maxsplit=1)[0]) if item.startswith('/') else 0
+            result[key] = item[:keep] + 'x' * (len(item) - keep)
+        else:
+            result[key] = anonymize_payload(item, salt)
+    return result
+
+class UpdateRecorder:
+    """Buffers incoming updates and appends them to a gzipped JSONL file.
+
+    record() only stores a reference, so the event loop pays almost
+    nothing; flush() serializes, optionally anonymizes and appends the
+    batch as a new gzip member, and is meant to run in a worker thread.
+    Each line is {"t": unix time received, "u": update payload}.
+    """
+
+    def __init__(self, path=CAPTURE_PATH, anonymize=CAPTURE_ANONYMIZE, salt=CAPTURE_SALT):
+        self.path = path
+        self.anonymize = anonymize
+        self.salt = salt
+        self._buffer = []
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, update):
+        """Keep an update for the next flush."""
+        if len(self._buffer) >= CAPTURE_BUFFER_LIMIT:
+            self.dropped += 1
+            return
+        self._buffer.append((datetime.now().timestamp(), update))
+
+    def flush(self):
+        """Append buffered updates to the capture file. Returns how many were written."""
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        lines = []
+        for received, update in batch:
+            payload = update.to_dict()
+            if self.anonymize:
+                payload = anonymize_payload(payload, self.salt)
+            lines.append(json.dumps({'t': round(received, 3), 'u': payload}, separators=(',', ':'), ensure_ascii=False))
+        # Appends from the periodic job and shutdown must not interleave
+        with self._lock, gzip.open(self.path, 'at', encoding='utf-8') as out:
+            out.write("\n".join(lines) + "\n")
+        self.recorded += len(lines)
+        return len(lines)
+
+update_recorder = UpdateRecorder()
+
+def iter_captured_updates(path):
+    """Yield (unix time, update payload) from a capture file, oldest first."""
+    with gzip.open(path, 'rt', encoding='utf-8') as captured:
+        for line in captured:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['t'], entry['u']
+
+# ---------------------------------------------------
+# UPDATE SCHEDULING
 # ---------------------------------------------------
 
+PRIORITY_INTERACTIVE = 0  # commands, button taps
+PRIORITY_MEMBERSHIP = 1   # joins and leaves
+PRIORITY_BOOKKEEPING = 2  # plain messages, only tracked for activity
+
+def classify_update_priority(update) -> int:
+    """Decide how urgently an update needs handling."""
+    if not isinstance(update, Update):
+        return PRIORITY_MEMBERSHIP
+    if update.callback_query or update.inline_query:
+        return PRIORITY_INTERACTIVE
+    message = update.message
+    if message:
+        if message.text and message.text.startswith('/'):
+            return PRIORITY_INTERACTIVE
+        if message.new_chat_members or message.left_chat_member:
+            return PRIORITY_MEMBERSHIP
+    return PRIORITY_BOOKKEEPING
+
+class PriorityUpdateProcessor(BaseUpdateProcessor):
+    """Update processor that runs commands ahead of bookkeeping and sheds load.
+
+    Updates from the same chat run strictly one after another, in arrival
+    order; updates from different chats run in parallel, up to
+    UPDATE_WORKERS at once. A chat whose turn has come waits in a priority
+    queue for a worker, so commands and callbacks jump ahead of activity
+    tracking in other chats. Per-chat state only exists while the chat
+    has updates queued or running, so idle chats cost no memory.
+
+    Once the queue is deeper than UPDATE_SHED_THRESHOLD, bookkeeping
+    updates are sampled: one in UPDATE_SAMPLE_EVERY still runs its
+    handlers, the rest are merged into a per-(chat, user) buffer that is
+    written in one batch. Past UPDATE_DROP_THRESHOLD they are dropped.
+
+    checkpoint() persists the highest update id below which every update
+    has finished, so a restart can resume from there.
+    """
+
+    def __init__(self, workers=UPDATE_WORKERS, backlog_limit=UPDATE_BACKLOG_LIMIT, tenant=None):
+        super().__init__(max_concurrent_updates=backlog_limit)
+        self.tenant = tenant
+        self._workers = workers
+        self._pending = 0
+        self._running = 0
+        self._waiting = []
+        self._chat_turns = {}
+        self._sequence = itertools.count()
+        self._bookkeeping_seen = 0
+        self._merged_activity = {}
+        self._in_flight = set()
+        self._saved_update_id = 0
+        self.highest_update_id = 0
+        self.processed = 0
+        self.shed_counts = {'sampled': 0, 'merged': 0, 'dropped': 0}
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of updates waiting for their chat's turn or for a worker."""
+        return self._pending - self._running
+
+    def snapshot(self) -> dict:
+        """Current queue and shedding metrics."""
+        return {
+            'queue_depth': self.queue_depth,
+            'running': self._running,
+            'busy_chats': len(self._chat_turns),
+            'processed': self.processed,
+            'merged_pending': len(self._merged_activity),
+            'shed': dict(self.shed_counts),
+        }
+
+    async def initialize(self) -> None:
+        """Nothing to set up."""
+
+    async def shutdown(self) -> None:
+        """Write out any merged activity and the update offset."""
+        self.checkpoint()
+
+    @property
+    def finished_update_id(self) -> int:
+        """Highest update id with every earlier update finished; 0 before the first."""
+        if self._in_flight:
+            return min(self._in_flight) - 1
+        return self.highest_update_id
+
+    def checkpoint(self):
+        """Write merged activity, then persist the update offset it covers."""
+        self.flush_merged_activity()
+        update_id = self.finished_update_id
+        if update_id > self._saved_update_id:
+            set_bot_state('update_offset', update_id)
+            self._saved_update_id = update_id
+
+    async def do_process_update(self, update, coroutine) -> None:
+        if self.tenant is not None:
+            # Each update runs in its own task, so this only affects this update
+            current_tenant.set(self.tenant)
+        if isinstance(update, Update):
+            self.highest_update_id = max(self.highest_update_id, update.update_id)
+            if update_recorder.enabled:
+                update_recorder.record(update)
+        priority = classify_update_priority(update)
+        if (
+            priority == PRIORITY_BOOKKEEPING
+            and self.queue_depth >= UPDATE_SHED_THRESHOLD
+            and self._shed(update)
+        ):
+            coroutine.close()
+            return
+
+        chat = update.effective_chat if isinstance(update, Update) else None
+        trace = UpdateTrace(update.update_id, chat.id if chat else None) if isinstance(update, Update) else None
+        if trace is not None:
+            self._in_flight.add(update.update_id)
+        self._pending += 1
+        try:
+            async with self._chat_turn(chat.id if chat else None):
+                await self._acquire(priority)
+                try:
+                    if trace is None:
+                        await coroutine
+                    else:
+                        trace.queued_ms = (perf_counter() - trace.started) * 1000
+                        token = current_trace.set(trace)
+                        try:
+                            await coroutine
+                        finally:
+                            current_trace.reset(token)
+                            finish_trace(trace)
+                finally:
+                    self.processed += 1
+                    self._release()
+        finally:
+            self._pending -= 1
+            if trace is not None:
+                self._in_flight.discard(update.update_id)
+
+    @asynccontextmanager
+    async def _chat_turn(self, chat_id):
+        """Wait until every earlier update from this chat has finished."""
+        if chat_id is None:
+            yield
+            return
+
+        turn = self._chat_turns.get(chat_id)
+        if turn is None:
+            turn = self._chat_turns[chat_id] = [asyncio.Lock(), 0]
+        turn[1] += 1
+        try:
+            # asyncio.Lock wakes waiters first-in first-out, which keeps chat order
+            async with turn[0]:
+                yield
+        finally:
+            turn[1] -= 1
+            if turn[1] == 0:
+                del self._chat_turns[chat_id]
+
+    async def _acquire(self, priority):
+        if self._running < self._workers and not self._waiting:
+            self._running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                # Hand the slot straight to the next waiter
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _shed(self, update) -> bool:
+        """Deal with a bookkeeping update cheaply. Returns False if it should run normally."""
+        overloaded = self.queue_depth >= UPDATE_DROP_THRESHOLD
+        self._bookkeeping_seen += 1
+        if not overloaded and self._bookkeeping_seen % UPDATE_SAMPLE_EVERY == 0:
+            self.shed_counts['sampled'] += 1
+            return False
+        if not overloaded and self.merge_activity(update):
+            self.shed_counts['merged'] += 1
+            return True
+        self.shed_counts['dropped'] += 1
+        return True
+
+    def merge_activity(self, update) -> bool:
+        """Fold a message into the pending activity batch instead of handling it."""
+        user, chat = update.effective_user, update.effective_chat
+        if not user or not chat:
+            return False
+        if user.is_bot or chat.type == 'private':
+            # Nothing to track, shedding it is free
+            return True
+
+        member = (chat.id, user.id)
+        pending = self._merged_activity.get(member)
+        if pending is None:
+            if len(self._merged_activity) >= UPDATE_MERGE_LIMIT:
+                return False
+            pending = self._merged_activity[member] = [extract_user_info(user), 0]
+        pending[1] += 1
+
+        active_tenant().stats.incr(chat.id, 'messages')
+        active_tenant().stats.mark_active(chat.id, user.id)
+        return True
+
+    def flush_merged_activity(self):
+        """Write merged activity to the database in one batch."""
+        if not self._merged_activity:
+            return
+        merged, self._merged_activity = self._merged_activity, {}
+        bulk_track_activity([
+            (user_info, chat_id, count)
+            for (chat_id, _), (user_info, count) in merged.items()
+        ])
+
+# ---------------------------------------------------
+# EVENT LOOP HEALTH
+# ---------------------------------------------------
+
+LAG_BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 5000, float('inf'))
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a periodic heartbeat.
+
+    The heartbeat task records each scheduling delay in a histogram. A
+    watchdog thread checks the heartbeat from outside the loop; when the
+    loop has been blocked for LOOP_STALL_THRESHOLD it logs the loop
+    thread's current stack, once per stall, to show what is blocking it.
+    """
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL, stall_threshold=LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.histogram = dict.fromkeys(LAG_BUCKETS_MS, 0)
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self._heartbeat = monotonic()
+        self._loop_thread_id = None
+        self.loop = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start the heartbeat on the running loop and the watchdog thread."""
+        if self._task is not None and not self._task.done():
+            # Already running for another tenant on this loop
+            return
+        self._loop_thread_id = threading.get_ident()
+        self.loop = asyncio.get_running_loop()
+        self._heartbeat = monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        """Stop the heartbeat and the watchdog."""
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            expected = monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = monotonic()
+            lag_ms = max(0.0, (now - expected) * 1000)
+            self._heartbeat = now
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            for bound in LAG_BUCKETS_MS:
+                if lag_ms <= bound:
+                    self.histogram[bound] += 1
+                    break
+
+    def _watch(self):
+        reported = False
+        while not self._stopped.wait(self.interval):
+            blocked_for = self.blocked_for()
+            if blocked_for < self.stall_threshold:
+                reported = False
+                continue
+            if not reported:
+                reported = True
+                self.stalls += 1
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+                logger.warning("Event loop blocked for %.1fs, loop thread stack:\n%s", blocked_for, stack)
+
+    def blocked_for(self) -> float:
+        """Seconds since the heartbeat should last have run."""
+        return max(0.0, monotonic() - self._heartbeat - self.interval)
+
+    def percentile_ms(self, fraction) -> float:
+        """Upper bound of the histogram bucket holding the given percentile."""
+        total = sum(self.histogram.values())
+        if not total:
+            return 0.0
+        running = 0
+        for bound, count in self.histogram.items():
+            running += count
+            if running >= total * fraction:
+                # The open-ended top bucket reports the worst lag seen instead
+                return bound if bound != float('inf') else round(self.max_lag_ms, 2)
+        return round(self.max_lag_ms, 2)
+
+    def snapshot(self) -> dict:
+        """Current lag metrics."""
+        return {
+            'last_lag_ms': round(self.last_lag_ms, 2),
+            'max_lag_ms': round(self.max_lag_ms, 2),
+            'blocked_ms': round(self.blocked_for() * 1000, 2),
+            'p50_ms': self.percentile_ms(0.5),
+            'p99_ms': self.percentile_ms(0.99),
+            'stalls': self.stalls,
+            'histogram': {str(bound): count for bound, count in self.histogram.items()},
+        }
+
+loop_monitor = LoopLagMonitor()
+
+def probe_database() -> float:
+    """Time a small read on each tenant's database, in ms. Raises if one is unusable."""
+    started = perf_counter()
+    for tenant in TENANTS:
+        conn = sqlite3.connect(tenant.database_path, timeout=READY_MAX_DB_MS / 1000)
+        try:
+            conn.execute("SELECT 1 FROM users LIMIT 1").fetchall()
+        finally:
+            conn.close()
+    return (perf_counter() - started) * 1000
+
+def readiness_report() -> dict:
+    """Check loop lag, DB latency and update backlog against their limits."""
+    loop = loop_monitor.snapshot()
+    loop_lag_ms = max(loop['blocked_ms'], loop['last_lag_ms'])
+    try:
+        db_ms = probe_database()
+        db_error = None
+    except sqlite3.Error as e:
+        db_ms = None
+        db_error = str(e)
+    backlog = sum(tenant.processor.queue_depth for tenant in TENANTS)
+
+    ready = (
+        loop_lag_ms <= READY_MAX_LOOP_LAG_MS
+        and db_ms is not None and db_ms <= READY_MAX_DB_MS
+        and backlog <= READY_MAX_BACKLOG
+    )
+    return {
+        'ready': ready,
+        'loop_lag_ms': round(loop_lag_ms, 2),
+        'db_ms': round(db_ms, 2) if db_ms is not None else None,
+        'db_error': db_error,
+        'backlog': backlog,
+        'loop': loop,
+    }
+
+# ---------------------------------------------------
+# PROFILING
+# ---------------------------------------------------
+
+# Only one profile at a time; nothing runs between requests
+profile_lock = threading.Lock()
+
+def collapse_stack(thread_name, frame) -> str:
+    """One stack as a flame graph line prefix: thread;outer;...;inner."""
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    calls.append(thread_name)
+    return ";".join(reversed(calls))
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL):
+    """Sample every other thread's stack for `seconds`; returns collapsed stack counts.
+
+    Covers the event loop, asyncio.to_thread workers running DB calls and
+    the logging and watchdog threads alike. Run it in its own thread.
+    """
+    stacks = defaultdict(int)
+    own_id = threading.get_ident()
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own_id:
+                stacks[collapse_stack(names.get(thread_id, str(thread_id)), frame)] += 1
+        sleep(interval)
+    return stacks
+
+def profile_event_loop(seconds) -> bytes:
+    """Run cProfile on the event loop thread for `seconds`; returns a marshalled pstats dump.
+
+    cProfile only sees the thread that enables it, so enabling and
+    disabling are scheduled onto the loop. Raises RuntimeError if the
+    loop is not running or does not respond.
+    """
+    loop = loop_monitor.loop
+    if loop is None or loop.is_closed():
+        raise RuntimeError("event loop is not running")
+
+    profiler = cProfile.Profile()
+    finished = threading.Event()
+
+    def stop():
+        profiler.disable()
+        finished.set()
+
+    loop.call_soon_threadsafe(profiler.enable)
+    sleep(seconds)
+    loop.call_soon_threadsafe(stop)
+    if not finished.wait(LOOP_STALL_THRESHOLD + 5):
+        raise RuntimeError("event loop did not respond")
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+# ---------------------------------------------------
+# BROADCASTS
+# ---------------------------------------------------
+
+class RateLimiter:
+    """Spaces out calls so they never exceed `rate` per second overall."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def wait(self):
+        """Sleep until this caller's slot comes up."""
+        now = monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. after a flood-control error."""
+        self._next_slot = max(self._next_slot, monotonic() + seconds)
+
+async def send_broadcast_message(bot, chat_id, message) -> bool:
+    """Send one broadcast message, retrying flood control and network errors."""
+    limiter = active_tenant().broadcast_limiter
+    for attempt in range(BROADCAST_MAX_RETRIES):
+        await limiter.wait()
+        try:
+            await bot.send_message(chat_id=chat_id, text=message, parse_mode=ParseMode.HTML)
+            return True
+        except RetryAfter as e:
+            # Flood limits apply to the whole bot, so every sender backs off
+            limiter.pause(e.retry_after)
+        except (Forbidden, BadRequest) as e:
+            logger.info("Broadcast skipped chat %s: %s", chat_id, e)
+            return False
+        except NetworkError as e:
+            await asyncio.sleep(2 ** attempt)
+            logger.warning("Broadcast retry %s for chat %s: %s", attempt + 1, chat_id, e)
+    return False
+
+async def run_broadcast(bot, broadcast_id, message, after_chat_id=None, sent=0, failed=0):
+    """Send a broadcast to every known group, resuming after `after_chat_id`.
+
+    Target chats are paged by chat_id, so only one batch is ever in
+    memory. Each batch is sent with bounded concurrency under the global
+    rate limit, and the checkpoint is saved once the whole batch is done;
+    an interrupted broadcast resends at most one batch.
+    """
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    after_chat_id = after_chat_id if after_chat_id is not None else -(2 ** 63)
+
+    async def send(chat_id):
+        async with semaphore:
+            return await send_broadcast_message(bot, chat_id, message)
+
+    while True:
+        chat_ids = get_broadcast_targets(after_chat_id, BROADCAST_BATCH_SIZE)
+        if not chat_ids:
+            break
+        results = await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+        delivered = sum(results)
+        sent += delivered
+        failed += len(results) - delivered
+        after_chat_id = chat_ids[-1]
+        checkpoint_broadcast(broadcast_id, after_chat_id, sent, failed)
+
+    finish_broadcast(broadcast_id)
+    logger.info("Broadcast %s finished: %s sent, %s failed", broadcast_id, sent, failed)
+    return sent, failed
+
+# ---------------------------------------------------
+# HANDLER FUNCTIONS
+# ---------------------------------------------------
+
+async def is_chat_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Check whether the user behind an update administers the chat."""
+    if not update.effective_user or not update.effective_chat:
+        return False
+    try:
+        member = await context.bot.get_chat_member(update.effective_chat.id, update.effective_user.id)
+    except Exception as e:
+        logger.warning("Could not check admin status in chat %s: %s", update.effective_chat.id, e)
+        return False
+    return member.status in ['administrator', 'creator']
+
 async def typing_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send typing action before responding."""
     if update.effective_chat:
@@ -559,12 +2989,12 @@ async def collect_group_members(update: Update, context: ContextTypes.DEFAULT_TY
             # Bot is admin, can collect member list
             try:
                 chat_member_count = await context.bot.get_chat_member_count(chat_id)
-                logger.info(f"Chat {chat_id} has {chat_member_count} total members")
+                logger.info("Chat %s has %s total members", chat_id, chat_member_count)
                 if chat_member_count <= MAX_MEMBERS_PER_BATCH:
                     # Telegram Bot API doesn't provide direct member enumeration
                     pass
             except Exception as e:
-                logger.warning(f"Could not get member count for chat {chat_id}: {e}")
+                logger.warning("Could not get member count for chat %s: %s", chat_id, e)
 
         # Get chat administrators (always available)
         administrators = await context.bot.get_chat_administrators(chat_id)
@@ -573,9 +3003,9 @@ async def collect_group_members(update: Update, context: ContextTypes.DEFAULT_TY
                 user_info = extract_user_info(admin.user)
                 add_or_update_user(**user_info)
                 add_chat_member(chat_id, admin.user.id, admin.status)
-        logger.info(f"Collected {len(administrators)} administrators for chat {chat_id}")
+        logger.info("Collected %s administrators for chat %s", len(administrators), chat_id)
     except Exception as e:
-        logger.warning(f"Could not collect group members for chat {chat_id}: {e}")
+        logger.warning("Could not collect group members for chat %s: %s", chat_id, e)
 
 async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle new chat members."""
@@ -588,7 +3018,8 @@ async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_info = extract_user_info(member)
             add_or_update_user(**user_info)
             add_chat_member(chat_id, member.id, 'member')
-            logger.info(f"Added new member {member.id} to chat {chat_id}")
+            logger.info("Added new member %s to chat %s", member.id, chat_id)
+    member_rosters.invalidate(chat_id)
 
 async def handle_member_left(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle member leaving chat."""
@@ -597,15 +3028,16 @@ async def handle_member_left(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     chat_id = update.effective_chat.id
     user_id = update.message.left_chat_member.id
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE chat_members 
-        SET status = 'left' 
-        WHERE chat_id = ? AND user_id = ?
-    ''', (chat_id, user_id))
-    conn.commit()
-    logger.info(f"Member {user_id} left chat {chat_id}")
+    with get_db_connection(chat_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE chat_members 
+            SET status = 'left' 
+            WHERE chat_id = ? AND user_id = ?
+        ''', (chat_id, user_id))
+        conn.commit()
+    member_rosters.invalidate(chat_id)
+    logger.info("Member %s left chat %s", user_id, chat_id)
 
 async def track_message_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Track user message activity for better member data collection."""
@@ -620,6 +3052,30 @@ async def track_message_activity(update: Update, context: ContextTypes.DEFAULT_T
     add_or_update_user(**user_info)
     update_member_activity(chat_id, user.id)
 
+def count_update_stats(update: Update, commands, bot_username):
+    """Count one group message as a command of this bot or a plain message."""
+    if not update.effective_chat or update.effective_chat.type == 'private':
+        return
+    if not update.message:
+        return
+
+    chat_id = update.effective_chat.id
+    text = update.message.text or ''
+    command, _, addressee = text.split(maxsplit=1)[0][1:].partition('@') if text.startswith('/') else ('', '', '')
+    # Only this bot's commands count; unknown ones and other bots' are plain messages
+    if (command.lower() in commands
+            and (not addressee or addressee.lower() == (bot_username or '').lower())):
+        active_tenant().stats.incr(chat_id, 'commands', command.lower())
+    else:
+        active_tenant().stats.incr(chat_id, 'messages')
+
+    if update.effective_user and not update.effective_user.is_bot:
+        active_tenant().stats.mark_active(chat_id, update.effective_user.id)
+
+async def record_update_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Count messages, commands and active members for /stats."""
+    count_update_stats(update, context.bot_data.get('commands', ()), context.bot.username)
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command."""
     user = update.effective_user
@@ -650,7 +3106,9 @@ U just unlocked the grindset. Let’s farm that aura like a menace 💀
 /respect – Real one badge  
 /sus – Suspicion check  
 /ghost – Nightfall aura  
-/aura – Daily farmer stats
+/aura – Daily farmer stats (add week or month)
+/stats – Chat activity stats
+/timezone – Group day & ghost hours
 
 ⚠️ <i>1 command per user/day/group. Pick wisely.</i>  
 
@@ -676,42 +3134,85 @@ U just unlocked the grindset. Let’s farm that aura like a menace 💀
 
 async def gay_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /gay command."""
-    await handle_single_user_command(update, context, 'gay')
+    await run_pick_command(update, context, 'gay')
 
 async def couple_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /couple command."""
-    await handle_couple_command(update, context)
+    await run_pick_command(update, context, 'couple')
 
 async def simp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /simp command."""
-    await handle_single_user_command(update, context, 'simp')
+    await run_pick_command(update, context, 'simp')
 
 async def toxic_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /toxic command."""
-    await handle_single_user_command(update, context, 'toxic')
+    await run_pick_command(update, context, 'toxic')
 
 async def cringe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /cringe command."""
-    await handle_single_user_command(update, context, 'cringe')
+    await run_pick_command(update, context, 'cringe')
 
 async def respect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /respect command."""
-    await handle_single_user_command(update, context, 'respect')
+    await run_pick_command(update, context, 'respect')
 
 async def sus_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /sus command."""
-    await handle_single_user_command(update, context, 'sus')
+    await run_pick_command(update, context, 'sus')
+
+async def ghost_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /ghost command - only works at night in the chat's timezone."""
+    await run_pick_command(update, context, 'ghost')
+
+def get_pick_spec(command: str) -> dict:
+    """Return the full declaration of a pick command, defaults filled in."""
+    return {**PICK_DEFAULTS, **PICK_COMMANDS[command]}
+
+def pick_window_open(window, zone) -> bool:
+    """Check a pick command's time-window gate in the chat's timezone."""
+    if window == 'night':
+        return day_rollover.is_night(zone)
+    return True
+
+def render_pick_message(command: str, spec: dict, selected_users, aura_change=None) -> str:
+    """Fill a random template with mentions of the picked users."""
+    mentions = [
+        get_user_mention_html_from_data(
+            selected['user_id'], selected['username'], selected['first_name'], selected['last_name']
+        )
+        for selected in selected_users
+    ]
+    message_template = random.choice(COMMAND_MESSAGES[command])
+    if spec['picks'] == 1:
+        final_message = message_template.format(user=mentions[0])
+    else:
+        final_message = message_template.format(
+            **{f"user{position}": mention for position, mention in enumerate(mentions, 1)}
+        )
+
+    if aura_change is not None:
+        aura_message = spec['aura_message']
+        if aura_message is None:
+            aura_message = "\n\n🦾 <b>+{aura} aura points!</b> 👑" if aura_change > 0 else "\n\n💀 <b>{aura} aura points!</b> 🗡️"
+        final_message += aura_message.format(aura=aura_change)
+    return final_message
 
-async def handle_single_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str):
-    """Handle commands that select a single user."""
+async def run_pick_command(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str):
+    """Run a daily pick command as declared in PICK_COMMANDS.
+
+    Every pick command shares this pipeline: group and time-window gates,
+    usage limits, replaying today's pick or sampling a new one, awarding
+    aura and rendering. Each step that touches the database is a single
+    batched transaction or query.
+    """
     if not update.effective_user or not update.effective_chat:
         return
 
+    spec = get_pick_spec(command)
+
     # Only work in groups
     if update.effective_chat.type == 'private':
-        await update.message.reply_text(
-            "💀 This move’s for bosses in groups. Link me up and set fire to that aura. 🔥"
-        )
+        await update.message.reply_text(spec['private_message'])
         return
 
     user = update.effective_user
@@ -720,368 +3221,511 @@ async def handle_single_user_command(update: Update, context: ContextTypes.DEFAU
 
     await typing_action(update, context)
 
-    # Add user to database
-    user_info = extract_user_info(user)
-    add_or_update_user(**user_info)
-    update_member_activity(chat_id, user_id)
+    zone = chat_timezones.get(chat_id)
+    if not pick_window_open(spec['window'], zone):
+        hours, minutes = day_rollover.until_night(zone)
+        await update.message.reply_text(
+            spec['window_closed_message'].format(hours=hours, minutes=minutes, timezone=zone)
+        )
+        return
+
+    # Profile and membership refresh in one transaction
+    bulk_track_activity([(extract_user_info(user), chat_id, 1)])
 
-    # ✅ Indented correctly now:
     can_use, reason = can_use_command(user_id, chat_id, command)
 
     if not can_use:
-        if reason == 'hourly_limit':
-            await update.message.reply_text(
-                f"⏳ Patience, boss! Wait an hour before hitting /{command} again 🦾"
-            )
-        else:
-            await update.message.reply_text(
-                f"⏳ You already ran /{command} today. Come back stronger tomorrow 👑"
-            )
+        limit_message = spec['hourly_limit_message'] if reason == 'hourly_limit' else spec['daily_limit_message']
+        await update.message.reply_text(limit_message.format(command=command))
         return
 
-    # Check if we already have today's selection
+    # Replay today's pick if there is one, resolving every profile in one query
     existing_selection = get_daily_selection(chat_id, command)
     if existing_selection:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT username, first_name, last_name
-                FROM users WHERE user_id = ?
-            """, (existing_selection['user_id'],))
-            selected_user_data = cursor.fetchone()
-
-        if selected_user_data:
-            selected_user_mention = get_user_mention_html_from_data(
-                existing_selection['user_id'],
-                selected_user_data['username'],
-                selected_user_data['first_name'],
-                selected_user_data['last_name']
-            )
-
-            message_template = random.choice(COMMAND_MESSAGES[command])
-            final_message = message_template.format(user=selected_user_mention)
-
+        selected_ids = [existing_selection['user_id'], existing_selection['user_id_2']][:spec['picks']]
+        profiles = get_users_by_ids([selected_id for selected_id in selected_ids if selected_id is not None])
+        if all(selected_id in profiles for selected_id in selected_ids):
+            final_message = render_pick_message(command, spec, [profiles[selected_id] for selected_id in selected_ids])
             await update.message.reply_text(final_message, parse_mode=ParseMode.HTML)
             mark_command_used(user_id, chat_id, command)
             return
 
-    active_members = get_active_chat_members(chat_id)
+    roster = member_rosters.get(chat_id)
 
-    if len(active_members) < 1:
-        await update.message.reply_text(
-            "💀 Can’t run this solo. Bring more energy to the chat 🦾"
-        )
+    if len(roster) < spec['picks']:
+        await update.message.reply_text(spec['too_few_message'])
         return
 
-    seed = f"{chat_id}_{command}_{date.today().isoformat()}"
-    selected_users = select_random_users_seeded(active_members, 1, seed)
+    exclude = [user_id] if spec['exclude_invoker'] else None
+    seed = f"{chat_id}_{command}_{day_rollover.today(zone)}"
+    selected_users = pick_roster_users(roster, spec['picks'], seed, exclude, spec['weighting'])
 
-    if not selected_users:
-        await update.message.reply_text(
-            "😬 No cap, couldn’t find a user. Try again later, fam!"
-        )
+    if len(selected_users) < spec['picks']:
+        await update.message.reply_text(spec['no_pick_message'])
         return
 
-    selected_user = selected_users[0]
-
-    save_daily_selection(chat_id, command, selected_user['user_id'])
-
+    # Selection and aura for every picked user in one transaction
     aura_change = AURA_POINTS[command]
-    update_aura_points(selected_user['user_id'], aura_change)
-
-    selected_user_mention = get_user_mention_html_from_data(
-        selected_user['user_id'],
-        selected_user['username'],
-        selected_user['first_name'],
-        selected_user['last_name']
-    )
+    selected_ids = [selected['user_id'] for selected in selected_users]
+    save_daily_pick(chat_id, command, selected_ids, aura_change)
+    for selected_id in selected_ids:
+        active_tenant().stats.incr(chat_id, 'picks', selected_id)
 
-    message_template = random.choice(COMMAND_MESSAGES[command])
-    final_message = message_template.format(user=selected_user_mention)
-
-    if aura_change > 0:
-        final_message += f"\n\n🦾 <b>+{aura_change} aura points!</b> 👑"
-    else:
-        final_message += f"\n\n💀 <b>{aura_change} aura points!</b> 🗡️"
+    final_message = render_pick_message(command, spec, selected_users, aura_change)
 
     await update.message.reply_text(final_message, parse_mode=ParseMode.HTML)
     mark_command_used(user_id, chat_id, command)
 
-async def handle_couple_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /couple command specifically."""
-    if not update.effective_user or not update.effective_chat:
+async def aura_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /aura command - show leaderboard."""
+    if not update.effective_chat:
         return
     
     # Only work in groups
     if update.effective_chat.type == 'private':
         await update.message.reply_text(
-            "💀 This command’s for real squads only. Add me to a group and start the aura hustle 🦾"
+            "🗿 Aura Farmers only grind in groups! Add me to a squad to see who’s flexing the most!"
         )
         return
     
-    user = update.effective_user
     chat_id = update.effective_chat.id
-    user_id = user.id
-    command = 'couple'
-    
-    await typing_action(update, context)
-    
-    # Add user to database
-    user_info = extract_user_info(user)
-    add_or_update_user(**user_info)
-    update_member_activity(chat_id, user_id)
-    
-    # Check if user can use command
-    can_use, reason = can_use_command(user_id, chat_id, command)
-    
-    if not can_use:
-        if reason == 'hourly_limit':
-            await update.message.reply_text(
-                f"⏳ Patience, boss! Wait an hour before hitting /{command} again 🦾"
-            )
-        else:
-            await update.message.reply_text(
-                f"⏳ You already ran /{command} today. Come back stronger tomorrow 👑"
-            )
-        return
-    
-    # Check if we already have today's selection
-    existing_selection = get_daily_selection(chat_id, command)
-    if existing_selection:
-        # Get user data for both users
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT username, first_name, last_name
-                FROM users WHERE user_id = ?
-            """, (existing_selection['user_id'],))
-            user1_data = cursor.fetchone()
-            
-            cursor.execute("""
-                SELECT username, first_name, last_name
-                FROM users WHERE user_id = ?
-            """, (existing_selection['user_id_2'],))
-            user2_data = cursor.fetchone()
-        
-        if user1_data and user2_data:
-            user1_mention = get_user_mention_html_from_data(
-                existing_selection['user_id'],
-                user1_data['username'],
-                user1_data['first_name'],
-                user1_data['last_name']
-            )
-            user2_mention = get_user_mention_html_from_data(
-                existing_selection['user_id_2'],
-                user2_data['username'],
-                user2_data['first_name'],
-                user2_data['last_name']
-            )
-            
-            # Choose random message
-            message_template = random.choice(COMMAND_MESSAGES[command])
-            final_message = message_template.format(user1=user1_mention, user2=user2_mention)
-            
-            await update.message.reply_text(final_message, parse_mode=ParseMode.HTML)
-            mark_command_used(user_id, chat_id, command)
-            return
-    
-    # Get active chat members
-    active_members = get_active_chat_members(chat_id)
-    
-    if len(active_members) < 2:
+
+    # Optional window: /aura week, /aura month
+    period = context.args[0].lower() if context.args else None
+    if period and period not in AURA_WINDOWS:
         await update.message.reply_text(
-            "💀 Squad too light to form a couple here. Bring the real ones! 🦾"
+            "🤔 Pick a window that exists: /aura, /aura week or /aura month 📈"
         )
         return
     
-    # Select 2 random users using seeded selection for consistency
-    seed = f"{chat_id}_{command}_{date.today().isoformat()}"
-    selected_users = select_random_users_seeded(active_members, 2, seed)
-    
-    if len(selected_users) < 2:
-        await update.message.reply_text(
-            "😭 Couple vibes not loading. Give it another shot later! 🌹"
-        )
-        return
+    await typing_action(update, context)
     
-    user1, user2 = selected_users
+    # Get leaderboard
+    if period:
+        leaderboard_data = get_windowed_leaderboard(chat_id, AURA_WINDOWS[period], 10)
+    else:
+        leaderboard_data = get_leaderboard(chat_id, 10)
     
-    # Save selection
-    save_daily_selection(chat_id, command, user1['user_id'], user2['user_id'])
+    # Get chat title if available
+    chat_title = getattr(update.effective_chat, 'title', None)
     
-    # Update aura points for both users
-    aura_change = AURA_POINTS[command]
-    update_aura_points(user1['user_id'], aura_change)
-    update_aura_points(user2['user_id'], aura_change)
+    # Format and send leaderboard
+    leaderboard_message = format_aura_leaderboard(leaderboard_data, chat_title, period)
     
-    # Create mentions
-    user1_mention = get_user_mention_html_from_data(
-        user1['user_id'], user1['username'], user1['first_name'], user1['last_name']
+    await update.message.reply_text(
+        leaderboard_message,
+        parse_mode=ParseMode.HTML,
+        reply_markup=leaderboard_keyboard(period)
     )
-    user2_mention = get_user_mention_html_from_data(
-        user2['user_id'], user2['username'], user2['first_name'], user2['last_name']
+
+async def aura_refresh_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the refresh button under a leaderboard.
+
+    Every tap is answered right away; the edit itself goes through the
+    refresher, which folds a burst of taps into a single edit.
+    """
+    query = update.callback_query
+    message = query.message if query else None
+    if not message or not message.is_accessible:
+        if query:
+            await query.answer()
+        return
+
+    period = query.data.split(':', 1)[1]
+    period = period if period in AURA_WINDOWS else None
+    queued = leaderboard_refresher.request(
+        context.bot, message.chat.id, message.message_id, period, message.chat.title
     )
-    
-    # Choose random message and send
-    message_template = random.choice(COMMAND_MESSAGES[command])
-    final_message = message_template.format(user1=user1_mention, user2=user2_mention)
-    
-    # Add aura change info
-    final_message += f"\n\n🫶 <b>Duo got +{aura_change} aura. Love stats rising 📈</b>"
-    
-    await update.message.reply_text(final_message, parse_mode=ParseMode.HTML)
-    mark_command_used(user_id, chat_id, command)
+    await query.answer("🔄 Refreshing..." if queued else "⏳ Already on it")
 
-async def ghost_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /ghost command - only works at night in Bangladesh time."""
-    if not update.effective_user or not update.effective_chat:
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer @bot queries with the user's rank and their groups' leaderboards.
+
+    The query text may be "week" or "month", like /aura. Results come from
+    cached standings shared by every user of a chat and are personalised
+    per user, so Telegram is told to cache each answer per user only.
+    """
+    query = update.inline_query
+    if not query:
         return
-    
+
+    period = query.query.strip().lower() or None
+    if period not in AURA_WINDOWS:
+        period = None
+
+    user_id = query.from_user.id
+    tenant = active_tenant().name
+    chat_ids = await inline_results.get(
+        (tenant, 'chats', user_id),
+        lambda: asyncio.to_thread(get_user_chats, user_id, INLINE_MAX_CHATS)
+    )
+    standings = await asyncio.gather(*(
+        inline_results.get(
+            (tenant, 'standings', chat_id, period),
+            lambda chat_id=chat_id: load_standings(context.bot, chat_id, period)
+        )
+        for chat_id in chat_ids
+    ))
+
+    results = build_inline_results(query.from_user, period, list(zip(chat_ids, standings)))
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats command - show chat activity from aggregated counters."""
+    if not update.effective_chat:
+        return
+
     # Only work in groups
     if update.effective_chat.type == 'private':
         await update.message.reply_text(
-            "💀 This ain’t a solo mission. Add me to a group to unlock the aura grind."
+            "📊 Stats only hit different in groups. Add me to a squad first!"
         )
         return
-    
-    user = update.effective_user
+
     chat_id = update.effective_chat.id
-    user_id = user.id
-    command = 'ghost'
-    
+
     await typing_action(update, context)
-    
-    # Check if it's night time in Bangladesh
-    if not is_night_time_in_bangladesh():
-        hours, minutes = get_time_until_night()
-        await update.message.reply_text(
-            f"🌙 Ghost vibes only from 6 PM to 6 AM BD!\n"
-			f"⏰ Chill for {hours}h {minutes}m, then come flex with the shadows... 👻"
-        )
+
+    # Aggregates plus whatever hasn't been flushed yet
+    rows = [*get_chat_stats(chat_id, STATS_WINDOW_DAYS), *active_tenant().stats.pending_rows(chat_id)]
+    summary = summarize_chat_stats(rows)
+    profiles = get_users_by_ids([user_id for user_id, _ in top_entries(summary['pick_totals'])])
+
+    chat_title = getattr(update.effective_chat, 'title', None)
+    stats_message = format_chat_stats(summary, profiles, chat_title)
+
+    await update.message.reply_text(stats_message, parse_mode=ParseMode.HTML)
+
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /timezone command - show the chat's timezone, or let admins change it."""
+    if not update.effective_chat:
         return
-    
-    # Add user to database
-    user_info = extract_user_info(user)
-    add_or_update_user(**user_info)
-    update_member_activity(chat_id, user_id)
-    
-    # Check if user can use command
-    can_use, reason = can_use_command(user_id, chat_id, command)
-    
-    if not can_use:
-        if reason == 'hourly_limit':
-            await update.message.reply_text(
-                f"⏰ Spirits gotta recharge! Hold up an hour before you summon again..."
-            )
-        else:
-            await update.message.reply_text(
-                f"👻 Ghost’s already been summoned today! They’re coming back tomorrow, so chill for now..."
-            )
+
+    # Only work in groups
+    if update.effective_chat.type == 'private':
+        await update.message.reply_text("🌍 Timezones are per group. Run this inside the squad!")
         return
-    
-    # Check if we already have today's selection
-    existing_selection = get_daily_selection(chat_id, command)
-    if existing_selection:
-        # Get user data for the existing selection
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT username, first_name, last_name
-                FROM users WHERE user_id = ?
-            """, (existing_selection['user_id'],))
-            selected_user_data = cursor.fetchone()
-        
-        if selected_user_data:
-            selected_user_mention = get_user_mention_html_from_data(
-                existing_selection['user_id'],
-                selected_user_data['username'],
-                selected_user_data['first_name'],
-                selected_user_data['last_name']
-            )
-            
-            # Choose random message
-            message_template = random.choice(COMMAND_MESSAGES[command])
-            final_message = message_template.format(user=selected_user_mention)
-            
-            await update.message.reply_text(final_message, parse_mode=ParseMode.HTML)
-            mark_command_used(user_id, chat_id, command)
-            return
-    
-    # Get active chat members
-    active_members = get_active_chat_members(chat_id)
-    
-    if len(active_members) < 1:
+
+    chat_id = update.effective_chat.id
+
+    if not context.args:
+        zone = chat_timezones.get(chat_id)
+        window = "🌙 Ghost hours are open" if day_rollover.is_night(zone) else "☀️ Ghost hours are closed"
         await update.message.reply_text(
-            "😭 Not enough squad energy here for the spirits to roll through! Get the crew up and try again!"
+            f"🌍 This squad runs on <b>{zone}</b>\n"
+            f"📅 Local day: {day_rollover.today(zone)}\n"
+            f"{window}\n\n"
+            "Admins can switch it with /timezone Region/City",
+            parse_mode=ParseMode.HTML
         )
         return
-    
-    # Select random user using seeded selection for consistency
-    seed = f"{chat_id}_{command}_{date.today().isoformat()}"
-    selected_users = select_random_users_seeded(active_members, 1, seed)
-    
-    if not selected_users:
+
+    if not await is_chat_admin(update, context):
+        await update.message.reply_text("🚫 Admins only, chief. Time bends for nobody else 🔒")
+        return
+
+    zone = resolve_timezone(context.args[0])
+    if zone is None:
         await update.message.reply_text(
-            "😭 Spirits came through but found no one to vibe with. Bounce back later and try again!"
+            "🤔 Never heard of that zone. Try /timezone Asia/Dhaka or /timezone Europe/London"
         )
         return
-    
-    selected_user = selected_users[0]
-    
-    # Save selection
-    save_daily_selection(chat_id, command, selected_user['user_id'])
-    
-    # Update aura points
-    aura_change = AURA_POINTS[command]
-    update_aura_points(selected_user['user_id'], aura_change)
-    
-    # Create mention
-    selected_user_mention = get_user_mention_html_from_data(
-        selected_user['user_id'],
-        selected_user['username'],
-        selected_user['first_name'],
-        selected_user['last_name']
+
+    chat_timezones.set(chat_id, zone)
+    todays_picks.forget_chat(chat_id)
+    await update.message.reply_text(
+        f"✅ Timezone set to <b>{zone}</b>. Daily picks and ghost hours now follow local time 🕛",
+        parse_mode=ParseMode.HTML
     )
-    
-    # Choose random message and send
-    message_template = random.choice(COMMAND_MESSAGES[command])
-    final_message = message_template.format(user=selected_user_mention)
-    
-    # Add aura change info
-    final_message += f"\n\n💀 <b>{aura_change} aura points! The spirits ain’t vibin’ with you...</b>"
-    
-    await update.message.reply_text(final_message, parse_mode=ParseMode.HTML)
-    mark_command_used(user_id, chat_id, command)
 
-async def aura_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /aura command - show leaderboard."""
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export command - send admins a compressed dump of this chat's data."""
     if not update.effective_chat:
         return
-    
+
     # Only work in groups
     if update.effective_chat.type == 'private':
         await update.message.reply_text(
-            "🗿 Aura Farmers only grind in groups! Add me to a squad to see who’s flexing the most!"
+            "📦 Exports are per group. Run this inside the squad you wanna back up!"
         )
         return
-    
+
+    if not await is_chat_admin(update, context):
+        await update.message.reply_text("🚫 Admins only, chief. No data heists today 🔒")
+        return
+
     chat_id = update.effective_chat.id
-    
-    await typing_action(update, context)
-    
-    # Get leaderboard
-    leaderboard_data = get_leaderboard(chat_id, 10)
-    
-    # Get chat title if available
-    chat_title = getattr(update.effective_chat, 'title', None)
-    
-    # Format and send leaderboard
-    leaderboard_message = format_aura_leaderboard(leaderboard_data, chat_title)
-    
+
+    await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_DOCUMENT)
+
+    with NamedTemporaryFile(suffix=".jsonl.gz", delete=False) as tmp:
+        export_path = tmp.name
+    try:
+        rows = await asyncio.to_thread(export_chat_data, chat_id, export_path)
+        with open(export_path, 'rb') as export_file:
+            await update.message.reply_document(
+                export_file,
+                filename=f"aura_export_{chat_id}_{date.today().isoformat()}.jsonl.gz",
+                caption=f"📦 {rows} rows exported. Keep it safe 🔐"
+            )
+    except Exception as e:
+        logger.error("Export failed for chat %s: %s", chat_id, e)
+        await update.message.reply_text("😵 Export broke mid-way. Try again in a bit!")
+    finally:
+        os.remove(export_path)
+
+async def backup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Take an online database backup - runs periodically."""
+    try:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        for source_path in database_paths():
+            dest_path = os.path.join(BACKUP_DIR, backup_name(source_path, stamp))
+            await asyncio.to_thread(backup_database, source_path, dest_path)
+        await asyncio.to_thread(prune_backups, BACKUP_DIR, BACKUP_KEEP)
+        logger.info("Database backed up to %s (%d files)", BACKUP_DIR, len(database_paths()))
+    except Exception as e:
+        logger.error("Database backup failed: %s", e)
+
+def parse_aura_adjustments(chat_id, args):
+    """Turn /bulkaura arguments into (user_id, delta) pairs.
+
+    Accepted forms:
+        <delta> active            every member active in the last 30 days
+        <delta> all               every current member
+        <delta> <user_id> ...     the same delta for each listed member
+        <user_id>:<delta> ...     a delta per member
+    Raises ValueError on anything else.
+    """
+    if not args:
+        raise ValueError("no adjustments given")
+
+    if ':' in args[0]:
+        pairs = []
+        for arg in args:
+            user_id, _, delta = arg.partition(':')
+            pairs.append((int(user_id), int(delta)))
+    else:
+        delta = int(args[0])
+        targets = args[1:]
+        if not targets:
+            raise ValueError("no targets given")
+        if abs(delta) > BULK_AURA_MAX_DELTA:
+            raise ValueError(f"deltas are capped at ±{BULK_AURA_MAX_DELTA}")
+        if targets == ['active']:
+            return [(user_id, delta) for user_id in member_rosters.get(chat_id).user_ids]
+        if targets == ['all']:
+            return [(row['user_id'], delta) for row in get_chat_users(chat_id)]
+        pairs = [(int(user_id), delta) for user_id in targets]
+
+    if any(abs(delta) > BULK_AURA_MAX_DELTA for _, delta in pairs):
+        raise ValueError(f"deltas are capped at ±{BULK_AURA_MAX_DELTA}")
+
+    # Hand-listed ids must be members of this chat
+    members = set(filter_chat_member_ids(chat_id, list({user_id for user_id, _ in pairs})))
+    return [(user_id, delta) for user_id, delta in pairs if user_id in members]
+
+async def bulk_aura_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /bulkaura command - admins reward or penalize many members at once.
+
+    All-time points are shared by every chat, so only bot owners move
+    them; a chat admin's adjustments land on this chat's week and month
+    boards only.
+    """
+    if not update.effective_chat:
+        return
+
+    # Only work in groups
+    if update.effective_chat.type == 'private':
+        await update.message.reply_text("⚡ Bulk aura only works inside a group, boss.")
+        return
+
+    is_owner = bool(update.effective_user) and update.effective_user.id in BOT_OWNER_IDS
+    if not is_owner and not await is_chat_admin(update, context):
+        await update.message.reply_text("🚫 Admins only, chief. Nice try tho 🔒")
+        return
+
+    chat_id = update.effective_chat.id
+
+    try:
+        adjustments = parse_aura_adjustments(chat_id, context.args)
+    except ValueError as e:
+        await update.message.reply_text(
+            f"🤔 Couldn't read that ({sanitize_html(str(e))}).\n"
+            "Use /bulkaura &lt;delta&gt; active|all, /bulkaura &lt;delta&gt; &lt;user_id&gt; ... "
+            "or /bulkaura &lt;user_id&gt;:&lt;delta&gt; ...",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    applied = apply_aura_adjustments(chat_id, adjustments, reason='bulk', profile=is_owner)
+    if not applied:
+        await update.message.reply_text("😶 Nobody in this chat matched, no aura moved.")
+        return
+
+    total = sum(delta for _, delta in applied)
+    scope = "" if is_owner else " on this chat's week and month boards"
     await update.message.reply_text(
-        leaderboard_message,
-        parse_mode=ParseMode.HTML
+        f"⚡ Aura adjusted for {len(applied)} members ({total:+} total){scope}. Stay humble 👑"
+    )
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /broadcast command - owner-only announcement to every group."""
+    if not update.effective_user or update.effective_user.id not in BOT_OWNER_IDS:
+        return
+
+    message = update.message.text.partition(' ')[2].strip()
+    if not message:
+        running = get_running_broadcasts()
+        if not running:
+            await update.message.reply_text("📣 Usage: /broadcast <message> (HTML allowed)")
+            return
+        status = "\n".join(
+            f"#{row['id']}: {row['sent']} sent, {row['failed']} failed" for row in running
+        )
+        await update.message.reply_text(f"📣 Broadcasts in flight:\n{status}")
+        return
+
+    broadcast_id = create_broadcast(message, update.effective_user.id)
+    start_broadcast_task(
+        context.application, deliver_broadcast(context.bot, broadcast_id, message, update.effective_user.id)
     )
+    await update.message.reply_text(f"📣 Broadcast #{broadcast_id} is rolling out 🚀")
+
+def start_broadcast_task(application, coro):
+    """Run a broadcast as a task of its own, outside the trace.
+
+    Application.create_task would make stop() wait for the whole
+    broadcast; these tasks are cancelled in on_stop instead and resumed
+    from their checkpoint at the next start.
+    """
+    task = asyncio.ensure_future(untraced(coro))
+    tasks = application.bot_data.setdefault('broadcasts', set())
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+async def deliver_broadcast(bot, broadcast_id, message, owner_id, after_chat_id=None, sent=0, failed=0):
+    """Run a broadcast and report the result to whoever started it."""
+    try:
+        sent, failed = await run_broadcast(bot, broadcast_id, message, after_chat_id, sent, failed)
+    except asyncio.CancelledError:
+        logger.info("Broadcast %s paused for shutdown", broadcast_id)
+        raise
+    except Exception as e:
+        logger.error("Broadcast %s stopped: %s", broadcast_id, e)
+        return
+    if owner_id:
+        try:
+            await bot.send_message(
+                chat_id=owner_id,
+                text=f"📣 Broadcast #{broadcast_id} done: {sent} sent, {failed} failed"
+            )
+        except Exception as e:
+            logger.warning("Could not report broadcast %s: %s", broadcast_id, e)
+
+async def resume_broadcasts(context: ContextTypes.DEFAULT_TYPE):
+    """Pick up broadcasts interrupted by a restart - runs once at startup."""
+    for row in get_running_broadcasts():
+        logger.info("Resuming broadcast %s after chat %s", row['id'], row['last_chat_id'])
+        start_broadcast_task(context.application, deliver_broadcast(
+            context.bot, row['id'], row['message'], row['created_by'],
+            row['last_chat_id'], row['sent'], row['failed']
+        ))
+
+async def flush_merged_activity(context: ContextTypes.DEFAULT_TYPE):
+    """Write activity merged while shedding load and save the update offset - runs periodically."""
+    try:
+        context.application.update_processor.checkpoint()
+    except Exception as e:
+        logger.error("Merged activity flush failed: %s", e)
+
+def is_recent_command(update, now) -> bool:
+    """Whether a backlog update is a command young enough to still answer."""
+    message = update.message
+    if not message or not message.text or not message.text.startswith('/'):
+        return False
+    return (now - message.date).total_seconds() <= CATCHUP_COMMAND_MAX_AGE
+
+async def catch_up_backlog(application: Application):
+    """Work through updates that arrived while the bot was down.
+
+    Starts after the persisted update offset and pulls CATCHUP_BATCH_SIZE
+    updates per call. Plain messages are folded into one batched activity
+    write per call, joins and leaves and recent commands run through the
+    normal handlers, and stale commands, button taps and inline queries
+    are only counted. Polling then starts after the last update seen here.
+    """
+    processor = application.update_processor
+    saved = int(get_bot_state('update_offset', 0))
+    offset = saved + 1 if saved else None
+    counts = {'folded': 0, 'handled': 0, 'stale': 0}
+
+    while True:
+        try:
+            updates = await application.bot.get_updates(
+                offset=offset, limit=CATCHUP_BATCH_SIZE, timeout=0,
+                allowed_updates=Update.ALL_TYPES
+            )
+        except Exception as e:
+            # Whatever is left is picked up by regular polling
+            logger.error("Backlog catch-up stopped: %s", e)
+            break
+        if not updates:
+            break
+
+        now = datetime.now(pytz.utc)
+        for update in updates:
+            priority = classify_update_priority(update)
+            if priority == PRIORITY_BOOKKEEPING and update.effective_message:
+                if processor.merge_activity(update):
+                    counts['folded'] += 1
+                    continue
+            elif priority == PRIORITY_INTERACTIVE and not is_recent_command(update, now):
+                if update.message:
+                    try:
+                        count_update_stats(
+                            update, application.bot_data.get('commands', ()), application.bot.username
+                        )
+                    except Exception as e:
+                        logger.error("Backlog update %s failed: %s", update.update_id, e)
+                counts['stale'] += 1
+                continue
+            try:
+                await application.process_update(update)
+            except Exception as e:
+                logger.error("Backlog update %s failed: %s", update.update_id, e)
+            counts['handled'] += 1
+
+        processor.highest_update_id = max(processor.highest_update_id, updates[-1].update_id)
+        processor.checkpoint()
+        offset = updates[-1].update_id + 1
+
+    if any(counts.values()):
+        logger.info(
+            "Backlog caught up: %d folded, %d handled, %d stale",
+            counts['folded'], counts['handled'], counts['stale']
+        )
+
+async def flush_capture(context: ContextTypes.DEFAULT_TYPE):
+    """Append captured updates to the capture file - runs periodically."""
+    try:
+        await asyncio.to_thread(update_recorder.flush)
+    except Exception as e:
+        logger.error("Update capture flush failed: %s", e)
+
+async def flush_stats(context: ContextTypes.DEFAULT_TYPE):
+    """Flush pending stat counters - runs periodically."""
+    try:
+        active_tenant().stats.flush()
+    except Exception as e:
+        logger.error("Stats flush failed: %s", e)
+
+async def advance_day_rollovers(context: ContextTypes.DEFAULT_TYPE):
+    """Roll over timezones whose midnight or night edge passed - runs periodically."""
+    try:
+        day_rollover.advance()
+    except Exception as e:
+        logger.error("Day rollover failed: %s", e)
 
 async def cleanup_expired_data(context: ContextTypes.DEFAULT_TYPE):
     """Cleanup expired data - runs periodically."""
@@ -1089,7 +3733,7 @@ async def cleanup_expired_data(context: ContextTypes.DEFAULT_TYPE):
         cleanup_old_data()
         logger.info("Database cleanup completed")
     except Exception as e:
-        logger.error(f"Database cleanup failed: {e}")
+        logger.error("Database cleanup failed: %s", e)
 
 def setup_periodic_jobs(application):
     """Setup periodic background jobs."""
@@ -1098,15 +3742,49 @@ def setup_periodic_jobs(application):
         if job_queue:
             # Run database cleanup every 24 hours
             job_queue.run_repeating(
-                cleanup_expired_data,
+                tenant_job(cleanup_expired_data),
                 interval=timedelta(hours=24),
                 first=timedelta(minutes=1)
             )
+            # Flush /stats counters in batches
+            job_queue.run_repeating(
+                tenant_job(flush_stats),
+                interval=STATS_FLUSH_INTERVAL,
+                first=STATS_FLUSH_INTERVAL
+            )
+            # Per-timezone midnights and night edges, fired once per zone
+            job_queue.run_repeating(
+                tenant_job(advance_day_rollovers),
+                interval=ROLLOVER_CHECK_INTERVAL,
+                first=ROLLOVER_CHECK_INTERVAL
+            )
+            # Batched writes for activity merged under load
+            job_queue.run_repeating(
+                tenant_job(flush_merged_activity),
+                interval=UPDATE_MERGE_FLUSH_INTERVAL,
+                first=UPDATE_MERGE_FLUSH_INTERVAL
+            )
+            # Append captured updates for local replay
+            if update_recorder.enabled:
+                job_queue.run_repeating(
+                    tenant_job(flush_capture),
+                    interval=CAPTURE_FLUSH_INTERVAL,
+                    first=CAPTURE_FLUSH_INTERVAL
+                )
+            # Resume broadcasts cut off by the last shutdown
+            job_queue.run_once(tenant_job(resume_broadcasts), when=timedelta(seconds=10))
+            # Online backups while the bot keeps running
+            if BACKUP_INTERVAL_HOURS > 0:
+                job_queue.run_repeating(
+                    tenant_job(backup_job),
+                    interval=timedelta(hours=BACKUP_INTERVAL_HOURS),
+                    first=timedelta(minutes=5)
+                )
             logger.info("Periodic jobs setup successfully")
         else:
             logger.warning("JobQueue not available. Periodic cleanup disabled.")
     except Exception as e:
-        logger.warning(f"Could not setup periodic jobs: {e}")
+        logger.warning("Could not setup periodic jobs: %s", e)
 
 async def on_startup(application: Application) -> None:
     """
@@ -1123,14 +3801,65 @@ async def on_startup(application: Application) -> None:
  	   BotCommand("sus", "👀 Spot the sus"),
 	    BotCommand("ghost", "👻 Night spook summon"),
 	    BotCommand("aura", "📈 Aura Farmers rank"),
+	    BotCommand("stats", "📊 Chat activity stats"),
+	    BotCommand("timezone", "🌍 Group timezone"),
 ]
     
     await application.bot.set_my_commands(commands)
     logger.info("Bot commands registered successfully")
 
+    if CATCHUP_BACKLOG:
+        await catch_up_backlog(application)
+
+    loop_monitor.start()
+
+async def on_stop(application: Application) -> None:
+    """Run once when the bot stops, before shutdown. Cancels broadcasts in flight.
+
+    They stay marked running, so resume_broadcasts carries on from the
+    last checkpoint at the next start.
+    """
+    tasks = list(application.bot_data.get('broadcasts', ()))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def on_shutdown(application: Application) -> None:
+    """Run once when the bot stops. Flushes counters still held in memory."""
+    loop_monitor.stop()
+    active_tenant().stats.flush()
+    logger.info("Pending stats flushed")
+    if update_recorder.enabled:
+        update_recorder.flush()
+
  # ─── Dummy HTTP Server to Keep Render Happy ─────────────────────────────────
 class DummyHandler(BaseHTTPRequestHandler):
     def do_GET(self):
+        if self.path == '/metrics':
+            metrics = {
+                **TENANTS[0].processor.snapshot(),
+                'rosters': member_rosters.snapshot(),
+                'inline_cache': inline_results.snapshot(),
+                'leaderboard_refresh': leaderboard_refresher.snapshot(),
+                'day_rollover': day_rollover.snapshot(),
+                'loop': loop_monitor.snapshot(),
+                'logs_dropped': log_handler.dropped,
+                'capture': {'recorded': update_recorder.recorded, 'dropped': update_recorder.dropped},
+            }
+            if len(TENANTS) > 1:
+                metrics['tenants'] = {tenant.name: tenant.processor.snapshot() for tenant in TENANTS}
+            self.send_json(200, metrics)
+            return
+
+        if self.path == '/ready':
+            report = readiness_report()
+            self.send_json(200 if report['ready'] else 503, report)
+            return
+
+        if urlsplit(self.path).path == '/profile':
+            self.send_profile()
+            return
+
         self.send_response(200)
         self.end_headers()
         self.wfile.write(b"AFK bot is alive!")
@@ -1139,20 +3868,83 @@ class DummyHandler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.end_headers()
 
+    def send_profile(self):
+        """GET /profile?seconds=10&format=collapsed|pstats with a bearer PROFILE_TOKEN.
+
+        collapsed samples every thread and returns flame graph input;
+        pstats runs cProfile on the event loop thread.
+        """
+        supplied = self.headers.get("Authorization", "").removeprefix("Bearer ").encode()
+        if not PROFILE_TOKEN or not hmac.compare_digest(supplied, PROFILE_TOKEN.encode()):
+            self.send_json(404 if not PROFILE_TOKEN else 403, {'error': 'forbidden'})
+            return
+
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            seconds = min(float(query.get('seconds', ['10'])[0]), PROFILE_MAX_SECONDS)
+        except ValueError:
+            seconds = 0
+        output = query.get('format', ['collapsed'])[0]
+        # nan slips through min() and every comparison, so check it explicitly
+        if not math.isfinite(seconds) or seconds <= 0 or output not in ('collapsed', 'pstats'):
+            self.send_json(400, {'error': 'use seconds=1..60 and format=collapsed or pstats'})
+            return
+        if not profile_lock.acquire(blocking=False):
+            self.send_json(409, {'error': 'a profile is already running'})
+            return
+
+        try:
+            logger.info("Profiling for %.0fs (%s)", seconds, output)
+            if output == 'pstats':
+                body = profile_event_loop(seconds)
+                content_type = "application/octet-stream"
+            else:
+                stacks = sample_stacks(seconds)
+                body = "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items())).encode()
+                content_type = "text/plain; charset=utf-8"
+        except RuntimeError as e:
+            self.send_json(503, {'error': str(e)})
+            return
+        finally:
+            profile_lock.release()
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Disposition", f"attachment; filename=profile.{output}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
 def start_dummy_server():
     port = int(os.environ.get("PORT", 10000))  # Render injects this
-    server = HTTPServer(("0.0.0.0", port), DummyHandler)
+    # Threaded so health checks keep answering while a profile runs
+    server = ThreadingHTTPServer(("0.0.0.0", port), DummyHandler)
     print(f"Dummy server listening on port {port}")
     server.serve_forever()
 
-def main():
-    """Start the bot."""
-    # Initialize database
-    init_database()
-    
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
-    
+def build_application(tenant, request, updater=True):
+    """Create a tenant's Application with every handler registered.
+
+    Also used by benchmarks/replay_updates.py with a fake request and no
+    updater, so replays run the exact production handler set.
+    """
+    builder = (
+        Application.builder()
+        .token(tenant.token)
+        .request(request)
+        .concurrent_updates(tenant.processor)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    application = builder.build()
+    application.bot_data['tenant'] = tenant
+
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("gay", gay_command))
@@ -1164,6 +3956,13 @@ def main():
     application.add_handler(CommandHandler("sus", sus_command))
     application.add_handler(CommandHandler("ghost", ghost_command))
     application.add_handler(CommandHandler("aura", aura_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("bulkaura", bulk_aura_command))
+    application.add_handler(InlineQueryHandler(inline_query))
+    application.add_handler(CallbackQueryHandler(aura_refresh_callback, pattern=r"^aura_refresh:"))
     
     # Add member tracking handlers
     application.add_handler(MessageHandler(
@@ -1175,23 +3974,111 @@ def main():
         handle_member_left
     ))
     
+    # Count every message for /stats before the regular handlers run
+    application.add_handler(MessageHandler(filters.ALL, record_update_stats), group=-1)
+
     # Track all messages for activity
     application.add_handler(MessageHandler(
         filters.ALL & ~filters.COMMAND,
         track_message_activity
     ))
     
+    # Commands /stats counts; anything else starting with / is a plain message
+    application.bot_data['commands'] = frozenset(
+        command
+        for handlers in application.handlers.values()
+        for handler in handlers if isinstance(handler, CommandHandler)
+        for command in handler.commands
+    )
+
+    # Trace handler time per update
+    instrument_handlers(application)
+    return application
+
+async def start_tenant(tenant, request):
+    """Initialise a tenant's database and start its bot on the running loop.
+
+    Run it as its own task: the tenant set here is inherited by every task
+    the application starts, including polling and the job queue.
+    """
+    current_tenant.set(tenant)
+    init_database()
+    application = build_application(tenant, request)
+    setup_periodic_jobs(application)
+    await application.initialize()
+    await on_startup(application)
+    await application.updater.start_polling(drop_pending_updates=not CATCHUP_BACKLOG)
+    await application.start()
+    logger.info("Bot %s started", tenant.name)
+    return application
+
+async def stop_tenant(application):
+    """Stop polling and handlers for one tenant; its resources stay open."""
+    current_tenant.set(application.bot_data['tenant'])
+    if application.updater and application.updater.running:
+        await application.updater.stop()
+    await application.stop()
+    await on_stop(application)
+
+async def shutdown_tenant(application):
+    """Release a stopped tenant's resources and flush its pending state."""
+    current_tenant.set(application.bot_data['tenant'])
+    await application.shutdown()
+    await on_shutdown(application)
+
+async def run_tenants():
+    """Run every tenant's bot on one event loop until SIGINT or SIGTERM.
+
+    All bots share one HTTP connection pool. Every bot is stopped before
+    any is shut down, so none sends through a pool that is already closed.
+    """
+    request = TracedRequest(connection_pool_size=256)
+    applications = [await asyncio.create_task(start_tenant(tenant, request)) for tenant in TENANTS]
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+
+    logger.info("Stopping %d bots...", len(applications))
+    for application in applications:
+        await asyncio.create_task(stop_tenant(application))
+    for application in applications:
+        await asyncio.create_task(shutdown_tenant(application))
+
+def main():
+    """Start the bot."""
+    if len(TENANTS) > 1:
+        logger.info("Starting %d Telegram Aura Bots in one process...", len(TENANTS))
+        asyncio.run(run_tenants())
+        return
+
+    # Initialize database
+    init_database()
+
+    # Create application
+    application = build_application(TENANTS[0], TracedRequest(connection_pool_size=256))
+
     # Setup periodic jobs
     setup_periodic_jobs(application)
     
-    # Register startup hook
+    # Register startup and shutdown hooks
     application.post_init = on_startup
+    application.post_stop = on_stop
+    application.post_shutdown = on_shutdown
     
     # Start the bot
     logger.info("Starting Telegram Aura Bot...")
-    application.run_polling(drop_pending_updates=True)
+    application.run_polling(drop_pending_updates=not CATCHUP_BACKLOG)
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate-partitions':
+        for tenant in TENANTS:
+            current_tenant.set(tenant)
+            logger.info("Moved %d rows of %s into partitions", migrate_to_partitions(), tenant.name)
+        sys.exit(0)
+
     # Start dummy HTTP server (needed for Render health check)
     threading.Thread(target=start_dummy_server, daemon=True).start()
     main()
\ No newline at end of file